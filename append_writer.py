@@ -0,0 +1,132 @@
+"""
+KS_Save_JSON 追加模式使用的常驻写入器。
+- 每个路径（realpath）保持一个以 "ab" 打开的句柄，写入先进入内存缓冲，不再每次执行都 open / write / close；
+- 缓冲达到 KS_JSON_APPEND_FLUSH_KB（默认 256 KB）立即落盘；不足时最迟 KS_JSON_APPEND_FLUSH_SEC
+  （默认 1 秒）后由后台定时器落盘；进程退出时全部落盘并关闭；
+- fsync=True 时每次落盘后执行一次 fsync（一次 fsync 覆盖缓冲中的多条记录）；
+- 后台定时落盘失败时保留缓冲并记录异常，下一次 write 抛出该异常（其间重试落盘成功则不再报告）；
+- 每次落盘前比较路径与已打开句柄的 (st_dev, st_ino)：文件被外部删除或轮转（改名后新建）时重新打开，
+  内容写入当前路径上的文件；
+- 本进程内读取该路径前（json_ultis / 列式缓存 / SQLite 数据集的读取入口），调用 flush_path 先落盘缓冲；
+- 同一路径改用覆盖 / 新建模式写入前，调用方需先 close_writer，保证已缓冲的追加内容先写入。
+"""
+import atexit
+import os
+import threading
+
+_FLUSH_BYTES = int(os.environ.get("KS_JSON_APPEND_FLUSH_KB", "256")) * 1024
+_FLUSH_SECONDS = float(os.environ.get("KS_JSON_APPEND_FLUSH_SEC", "1"))
+
+
+class AppendWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.buffered = 0       # 当前缓冲字节数
+        self.flushed = 0        # 累计落盘字节数
+        self.fsync = False
+        self._file = open(path, "ab")
+        self._buffer = []
+        self._timer = None
+        self._error = None      # 后台定时落盘的异常，由下一次 write 抛出
+        self._lock = threading.RLock()
+
+    def write(self, segments, fsync=False):
+        """追加若干 bytes 分段；返回 (写入后缓冲字节数, 累计落盘字节数)。"""
+        with self._lock:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            self.fsync = fsync
+            for segment in segments:
+                self._buffer.append(segment)
+                self.buffered += len(segment)
+                if self.buffered >= _FLUSH_BYTES:
+                    self.flush()
+            if self.buffered and self._timer is None:
+                self._timer = threading.Timer(_FLUSH_SECONDS, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return self.buffered, self.flushed
+
+    def _timed_flush(self):
+        with self._lock:
+            try:
+                self.flush()
+            except Exception as e:
+                self._error = e
+
+    def _reopen_if_moved(self):
+        """路径上的文件已不是当前句柄指向的文件（被删除或轮转）时，重新以追加方式打开。"""
+        try:
+            st = os.stat(self.path)
+            current = os.fstat(self._file.fileno())
+            if (st.st_dev, st.st_ino) == (current.st_dev, current.st_ino):
+                return
+        except FileNotFoundError:
+            pass
+        # 先打开新句柄：打开失败时保留旧句柄和缓冲，下一次落盘重试
+        new_file = open(self.path, "ab")
+        self._file.close()
+        self._file = new_file
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buffer or self._file.closed:
+                return
+            self._reopen_if_moved()
+            self._file.write(b"".join(self._buffer))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.flushed += self.buffered
+            self._buffer = []
+            self.buffered = 0
+            self._error = None  # 之前失败的内容已在本次重试中写入
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._file.close()
+
+
+_WRITERS = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def get_writer(path: str) -> AppendWriter:
+    real = os.path.realpath(path)
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(real)
+        if writer is None:
+            writer = _WRITERS[real] = AppendWriter(real)
+        return writer
+
+
+def flush_path(path: str):
+    """本进程读取 path 前调用：该路径有写入器时先把缓冲落盘（没有任何写入器时只做一次字典判断）。"""
+    if not _WRITERS:
+        return
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(os.path.realpath(path))
+    if writer is not None:
+        writer.flush()
+
+
+def close_writer(path: str):
+    """落盘并关闭 path 的写入器（不存在时什么也不做）。"""
+    with _WRITERS_LOCK:
+        writer = _WRITERS.pop(os.path.realpath(path), None)
+    if writer is not None:
+        writer.close()
+
+
+@atexit.register
+def close_all_writers():
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+        _WRITERS.clear()
+    for writer in writers:
+        writer.close()
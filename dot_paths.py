@@ -0,0 +1,60 @@
+"""
+点号路径取值（KS_Json_Extract_Key_And_Value_3ways 使用）。
+- 多条路径编译为一棵前缀树（按路径元组缓存），共享前缀的路径（如 subject.main_focus.a /
+  subject.main_focus.b）在每条记录上只走一遍公共子树，一次遍历填满所有路径的结果；
+- 取值规则与原 _get_value_by_path 相同：记录依次按路径中的每个键下钻，
+  任一层不是 dict 或缺少该键时该记录不产出值；结果按记录顺序排列。
+"""
+from functools import lru_cache
+
+
+class _Node:
+    __slots__ = ("outputs", "children")
+
+    def __init__(self):
+        self.outputs = []   # 在此结束的路径下标
+        self.children = {}  # 键 -> _Node
+
+
+class PathSet:
+    def __init__(self, paths):
+        self.paths = tuple(paths)
+        root = _Node()
+        for idx, path in enumerate(self.paths):
+            node = root
+            for key in path.split("."):
+                node = node.children.setdefault(key, _Node())
+            node.outputs.append(idx)
+        self._root = self._freeze(root)
+
+    def _freeze(self, node):
+        # (输出下标 tuple, ((键, 子节点), ...))：遍历时只做元组解包
+        return tuple(node.outputs), tuple((k, self._freeze(c)) for k, c in node.children.items())
+
+    def extract(self, records) -> list:
+        """返回与 paths 对应的结果列表，每项为各记录上该路径取到的值（按记录顺序）。"""
+        results = [[] for _ in self.paths]
+
+        def visit(node, value):
+            outputs, children = node
+            for idx in outputs:
+                results[idx].append(value)
+            if children and isinstance(value, dict):
+                for key, child in children:
+                    if key in value:
+                        visit(child, value[key])
+
+        root = self._root
+        for rec in records:
+            visit(root, rec)
+        return results
+
+
+@lru_cache(maxsize=256)
+def _compile(paths: tuple) -> PathSet:
+    return PathSet(paths)
+
+
+def compile_paths(paths) -> PathSet:
+    """编译一组点号路径（空路径由调用方过滤），相同路径组合复用同一棵前缀树。"""
+    return _compile(tuple(paths))
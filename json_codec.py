@@ -0,0 +1,222 @@
+"""
+统一的 JSON 编解码层：ks_json_tools / json_ultis / ks_api_tools 中的所有节点都通过这里编解码。
+- 安装了 orjson 或 ujson 时自动使用（优先 orjson），否则退回标准库 json；
+- 可用环境变量 KS_JSON_CODEC=json|orjson|ujson 强制指定后端；
+- 无论哪个后端，输出语义一致：不转义非 ASCII 字符（ensure_ascii=False），
+  indent=2 与 json.dumps(indent=2) 的排版相同，compact=True 对应 separators=(",", ":")；
+  orjson 会把 NaN / ±Infinity 写成 null，含这类值的对象始终交给标准库（输出 NaN / Infinity，loads 可读回）。
+  与标准库的差异：快速后端的浮点数文本形式可能不同（如 1e-05 写成 0.00001），解析回来的数值相同。
+  单行带空格的默认格式（", " / ": "）只有标准库能产生，这种情况始终走标准库。
+- 面向阅读的节点 STRING 输出（原先 indent=2 的节点）经 dumps_output 序列化，格式由环境变量 KS_JSON_OUTPUT_FORMAT 决定：
+  compact（无空格单行）、pretty（indent=2）或 auto（默认：紧凑结果不超过 KS_JSON_PRETTY_MAX_KB
+  时改为 pretty，便于在界面中阅读；大结果保持紧凑，只付一次编码的代价）。
+"""
+import json
+import math
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _select_backend() -> str:
+    wanted = os.environ.get("KS_JSON_CODEC", "").strip().lower()
+    available = {"json": True, "orjson": orjson is not None, "ujson": ujson is not None}
+    if wanted:
+        if not available.get(wanted):
+            print(f"KS_JSON_CODEC={wanted} 不可用，自动选择后端")
+        else:
+            return wanted
+    if orjson is not None:
+        return "orjson"
+    if ujson is not None:
+        return "ujson"
+    return "json"
+
+
+BACKEND = _select_backend()
+
+OUTPUT_FORMATS = ("compact", "pretty", "auto")
+
+
+def _select_output_format() -> str:
+    wanted = os.environ.get("KS_JSON_OUTPUT_FORMAT", "auto").strip().lower()
+    if wanted not in OUTPUT_FORMATS:
+        print(f"KS_JSON_OUTPUT_FORMAT={wanted} 无效，使用 auto")
+        return "auto"
+    return wanted
+
+
+OUTPUT_FORMAT = _select_output_format()
+# auto 模式下改用 pretty 的紧凑结果长度上限（字符数）
+PRETTY_MAX_CHARS = int(os.environ.get("KS_JSON_PRETTY_MAX_KB", "64")) * 1024
+
+
+def codec_backend() -> str:
+    """返回当前生效的 JSON 后端名称：orjson / ujson / json。"""
+    return BACKEND
+
+
+def loads(s):
+    """
+    解析 str / bytes / bytearray / memoryview。
+    快速后端解析失败时交给标准库重试（兼容 NaN、超长整数等），因此无效输入抛出的始终是 json.JSONDecodeError。
+    """
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            pass
+    elif BACKEND == "ujson" and not isinstance(s, memoryview):
+        try:
+            return ujson.loads(s)
+        except (ValueError, OverflowError):
+            pass
+    if isinstance(s, memoryview):
+        s = s.tobytes()
+    return json.loads(s)
+
+
+def _has_nonfinite(obj) -> bool:
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if type(item) is float:
+            if item != item or item in (math.inf, -math.inf):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return False
+
+
+def _orjson_dumps(obj, indent):
+    """orjson 编码为 bytes；不支持的类型或含 NaN / ±Infinity（orjson 会写成 null）时返回 None。"""
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent == 2 else 0)
+    try:
+        data = orjson.dumps(obj, option=option)
+    except (TypeError, orjson.JSONEncodeError):
+        return None  # 不支持的类型（如超出 64 位的整数），交给标准库
+    # 输出中没有 null 时不可能含非有限浮点数，只有出现 null 才需要遍历检查
+    if b"null" in data and _has_nonfinite(obj):
+        return None
+    return data
+
+
+def dumps(obj, indent=None, compact=False, ensure_ascii=False) -> str:
+    """
+    序列化为 JSON 字符串。
+    - indent=2：多行缩进；
+    - compact=True：无空格单行；
+    - 其他：与 json.dumps(obj, ensure_ascii=...) 相同的单行格式。
+    """
+    if not ensure_ascii and (indent == 2 or (indent is None and compact)):
+        if BACKEND == "orjson":
+            data = _orjson_dumps(obj, indent)
+            if data is not None:
+                return data.decode("utf-8")
+        elif BACKEND == "ujson":
+            try:
+                return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, indent=indent or 0)
+            except (TypeError, ValueError, OverflowError):
+                pass  # 含 NaN / Infinity 时 ujson 抛出异常，交给标准库
+    if compact and indent is None:
+        return json.dumps(obj, ensure_ascii=ensure_ascii, separators=(",", ":"))
+    return json.dumps(obj, ensure_ascii=ensure_ascii, indent=indent)
+
+
+def dumps_output(obj, fmt=None) -> str:
+    """
+    按输出格式序列化节点输出；fmt 为 None 时使用 KS_JSON_OUTPUT_FORMAT。
+    auto 先紧凑编码，只有结果较小时才重新编码为 pretty（此时重编码的代价可以忽略）。
+    """
+    fmt = fmt or OUTPUT_FORMAT
+    if fmt == "pretty":
+        return dumps(obj, indent=2)
+    text = dumps(obj, compact=True)
+    if fmt == "auto" and len(text) <= PRETTY_MAX_CHARS:
+        return dumps(obj, indent=2)
+    return text
+
+
+# ---- 分块编码：大结果直接写入文件 / socket，不生成与数据集等长的单个字符串 ----
+ENCODE_CHUNK = 1 << 20
+
+
+def _dumps_bytes(obj, indent=None, compact=False) -> bytes:
+    if BACKEND == "orjson" and (indent == 2 or (indent is None and compact)):
+        data = _orjson_dumps(obj, indent)
+        if data is not None:
+            return data
+    return dumps(obj, indent=indent, compact=compact).encode("utf-8")
+
+
+def _batched(parts, chunk_size):
+    buf = []
+    size = 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b"".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b"".join(buf)
+
+
+def iter_encode(obj, indent=None, compact=False, chunk_size=ENCODE_CHUNK):
+    """
+    与 dumps(obj, indent, compact) 输出相同的 UTF-8 字节，按约 chunk_size 字节分段产出。
+    顶层 list / dict 逐个元素编码（每个元素仍走快速后端），峰值内存约为一个分段加一个元素。
+    """
+    # 含非字符串键的 dict 按各后端自身规则转换键，整体编码
+    if not isinstance(obj, (list, dict)) or not obj or (isinstance(obj, dict) and not all(isinstance(k, str) for k in obj)):
+        yield _dumps_bytes(obj, indent, compact)
+        return
+    if indent == 2:
+        sep, kv_sep, head, tail = b",\n  ", b": ", b"\n  ", b"\n"
+    elif compact:
+        sep, kv_sep, head, tail = b",", b":", b"", b""
+    else:
+        sep, kv_sep, head, tail = b", ", b": ", b"", b""
+
+    def element(value):
+        data = _dumps_bytes(value, indent, compact)
+        # 元素位于第二层，缩进多一级
+        return data.replace(b"\n", b"\n  ") if indent == 2 else data
+
+    def parts():
+        if isinstance(obj, list):
+            yield b"[" + head
+            for i, value in enumerate(obj):
+                if i:
+                    yield sep
+                yield element(value)
+            yield tail + b"]"
+        else:
+            yield b"{" + head
+            for i, (key, value) in enumerate(obj.items()):
+                if i:
+                    yield sep
+                yield _dumps_bytes(key) + kv_sep
+                yield element(value)
+            yield tail + b"}"
+
+    yield from _batched(parts(), chunk_size)
+
+
+def iter_encode_lines(records, compact=True, chunk_size=ENCODE_CHUNK):
+    """
+    JSONL：每条记录一行，按约 chunk_size 字节分段产出。
+    compact=True 为无空格紧凑格式；False 为 json.dumps 默认的单行格式（", " / ": "，只有标准库能产生）。
+    """
+    return _batched((_dumps_bytes(rec, compact=compact) + b"\n" for rec in records), chunk_size)
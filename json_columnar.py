@@ -0,0 +1,278 @@
+"""
+JSONL 列式缓存：把 JSONL 中指定字段转换为 <文件>.kscol/ 目录下可内存映射的 .npy 数组，
+过滤/计数/随机抽取/加载节点只读取需要的列，不再逐条解析 JSON。
+
+目录结构：
+  meta.json               源文件 mtime_ns / size、行数、各列类型
+  _rows.npy               每条记录在源文件中的起始字节偏移（int64），用于按行号回读完整记录
+  <列>.present.npy        该字段是否存在（bool）
+  数值列 (num)：<列>.values.npy（float64，缺失为 NaN）、<列>.ints.npy（原值是否为 int）
+  字符串列 (str/json)：<列>.offsets.npy（int64，n+1）、<列>.blob.npy（uint8，UTF-8 拼接）
+    str 列存原始字符串；json 列（混合类型或嵌套值）存每个值的 JSON 文本。
+字段路径用点号表示嵌套 dict（如 subject.main_focus）。源文件变化（mtime 或 size）后缓存自动失效。
+"""
+import os
+import re
+import json
+
+import numpy as np
+
+from . import json_codec
+from .json_ultis import _mmap_file
+from .append_writer import flush_path
+
+_META_VERSION = 1
+_MISSING = object()
+_MAX_EXACT_INT = 2 ** 53
+
+
+def columnar_dir(jsonl_path: str) -> str:
+    return jsonl_path + ".kscol"
+
+
+def _column_file(cache_dir: str, field: str, part: str) -> str:
+    safe = re.sub(r"[^\w.-]", "_", field)
+    return os.path.join(cache_dir, f"{safe}.{part}.npy")
+
+
+def _get_path(rec, keys):
+    cur = rec
+    for k in keys:
+        if not isinstance(cur, dict) or k not in cur:
+            return _MISSING
+        cur = cur[k]
+    return cur
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+class StringColumn:
+    """按行号取值的字符串列，底层为 offsets + blob 两个内存映射数组。"""
+
+    def __init__(self, offsets, blob, present, is_json: bool):
+        self.offsets = offsets
+        self.blob = blob
+        self.present = present
+        self.is_json = is_json
+
+    def __len__(self):
+        return len(self.present)
+
+    def __getitem__(self, i):
+        if not self.present[i]:
+            return None
+        raw = self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+        return json_codec.loads(raw) if self.is_json else raw.decode("utf-8")
+
+
+class NumericColumn:
+    def __init__(self, values, ints, present):
+        self.values = values
+        self.ints = ints
+        self.present = present
+
+    def __len__(self):
+        return len(self.present)
+
+    def __getitem__(self, i):
+        if not self.present[i]:
+            return None
+        v = float(self.values[i])
+        return int(v) if self.ints[i] else v
+
+
+class ColumnarDataset:
+    def __init__(self, jsonl_path: str, cache_dir: str, meta: dict):
+        self.jsonl_path = jsonl_path
+        self.cache_dir = cache_dir
+        self.meta = meta
+        self.n_rows = meta["rows"]
+        self.kinds = meta["columns"]
+        self._columns = {}
+        self._row_offsets = None
+
+    def has(self, field: str, kinds=None) -> bool:
+        kind = self.kinds.get(field)
+        return kind is not None and (kinds is None or kind in kinds)
+
+    def _load(self, field, part):
+        return np.load(_column_file(self.cache_dir, field, part), mmap_mode="r")
+
+    def column(self, field: str):
+        """返回 NumericColumn 或 StringColumn（只映射该列的文件）。"""
+        col = self._columns.get(field)
+        if col is None:
+            kind = self.kinds[field]
+            present = self._load(field, "present")
+            if kind == "num":
+                col = NumericColumn(self._load(field, "values"), self._load(field, "ints"), present)
+            else:
+                col = StringColumn(self._load(field, "offsets"), self._load(field, "blob"), present, kind == "json")
+            self._columns[field] = col
+        return col
+
+    def present_values(self, field: str) -> list:
+        """按行顺序返回该字段存在的所有值（与逐条记录 `if key in item` 收集的结果一致）。"""
+        col = self.column(field)
+        return [col[i] for i in np.flatnonzero(col.present).tolist()]
+
+    def read_rows(self, indices) -> list[dict]:
+        """按行号从源 JSONL 回读完整记录，只解码被选中的行。"""
+        if self._row_offsets is None:
+            self._row_offsets = np.load(os.path.join(self.cache_dir, "_rows.npy"), mmap_mode="r")
+        offsets = self._row_offsets
+        out = []
+        with _mmap_file(self.jsonl_path) as mm:
+            for i in indices:
+                start = int(offsets[i])
+                end = mm.find(b"\n", start)
+                out.append(json_codec.loads(mm[start:end if end != -1 else len(mm)]))
+        return out
+
+
+def _read_meta(jsonl_path: str):
+    cache_dir = columnar_dir(jsonl_path)
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json_codec.loads(f.read())
+        st = os.stat(jsonl_path)
+    except (OSError, ValueError):
+        return None
+    if (meta.get("version") != _META_VERSION or meta.get("mtime_ns") != st.st_mtime_ns
+            or meta.get("size") != st.st_size):
+        return None
+    return meta
+
+
+def open_columnar(jsonl_path: str, fields=None):
+    """
+    打开与源文件一致的列式缓存；不存在、已过期或缺少 fields 中任一列时返回 None。
+    """
+    if not jsonl_path or not jsonl_path.lower().endswith(".jsonl") or not os.path.isfile(jsonl_path):
+        return None
+    flush_path(jsonl_path)
+    meta = _read_meta(jsonl_path)
+    if meta is None:
+        return None
+    if fields and any(f not in meta["columns"] for f in fields):
+        return None
+    return ColumnarDataset(jsonl_path, columnar_dir(jsonl_path), meta)
+
+
+def build_columnar_cache(jsonl_path: str, fields, force: bool = False) -> ColumnarDataset:
+    """
+    将 jsonl_path 中的 fields 转换为列式缓存。已有缓存仍有效时直接复用；
+    需要新字段时与已有字段合并后重建。
+    """
+    if not jsonl_path.lower().endswith(".jsonl") or not os.path.isfile(jsonl_path):
+        raise ValueError(f"{jsonl_path} 不是存在的 .jsonl 文件")
+    flush_path(jsonl_path)
+    fields = [f for f in dict.fromkeys(fields) if f]
+    meta = None if force else _read_meta(jsonl_path)
+    if meta is not None:
+        if all(f in meta["columns"] for f in fields):
+            return ColumnarDataset(jsonl_path, columnar_dir(jsonl_path), meta)
+        fields = list(dict.fromkeys(list(meta["columns"]) + fields))
+
+    st = os.stat(jsonl_path)
+    paths = [tuple(f.split(".")) for f in fields]
+    row_offsets = []
+    raw_values = [[] for _ in fields]
+
+    with _mmap_file(jsonl_path) as mm:
+        size = len(mm)
+        pos = 0
+        line_no = 0
+        while pos < size:
+            nl = mm.find(b"\n", pos)
+            if nl == -1:
+                nl = size
+            line_no += 1
+            line = mm[pos:nl]
+            if line.strip():
+                try:
+                    rec = json_codec.loads(line)
+                except json.JSONDecodeError as e:
+                    raise Exception(f"Invalid JSON at line {line_no} in {jsonl_path}: {str(e)}")
+                if not isinstance(rec, dict):
+                    raise ValueError(f"第 {line_no} 行不是合法 JSON 对象")
+                row_offsets.append(pos)
+                for values, keys in zip(raw_values, paths):
+                    values.append(_get_path(rec, keys))
+            pos = nl + 1
+
+    cache_dir = columnar_dir(jsonl_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, "_rows.npy"), np.asarray(row_offsets, dtype=np.int64))
+
+    kinds = {}
+    for field, values in zip(fields, raw_values):
+        kinds[field] = _write_column(cache_dir, field, values)
+
+    meta = {
+        "version": _META_VERSION,
+        "source": os.path.basename(jsonl_path),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "rows": len(row_offsets),
+        "columns": kinds,
+    }
+    # meta.json 最后写入：中途失败时旧 meta 与新文件不匹配，下次会重新构建
+    tmp = os.path.join(cache_dir, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json_codec.dumps(meta, indent=2))
+    os.replace(tmp, os.path.join(cache_dir, "meta.json"))
+    return ColumnarDataset(jsonl_path, cache_dir, meta)
+
+
+def _write_column(cache_dir: str, field: str, values: list) -> str:
+    present = np.fromiter((v is not _MISSING for v in values), dtype=bool, count=len(values))
+    np.save(_column_file(cache_dir, field, "present"), present)
+    present_values = [v for v in values if v is not _MISSING]
+
+    if all(_is_number(v) and (not isinstance(v, int) or abs(v) < _MAX_EXACT_INT) for v in present_values):
+        nums = np.fromiter((float(v) if v is not _MISSING else np.nan for v in values),
+                           dtype=np.float64, count=len(values))
+        ints = np.fromiter((isinstance(v, int) for v in values), dtype=bool, count=len(values))
+        np.save(_column_file(cache_dir, field, "values"), nums)
+        np.save(_column_file(cache_dir, field, "ints"), ints)
+        return "num"
+
+    kind = "str" if all(isinstance(v, str) for v in present_values) else "json"
+    encoded = [b"" if v is _MISSING else (v.encode("utf-8") if kind == "str" else json_codec.dumps(v, compact=True).encode("utf-8"))
+               for v in values]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    np.save(_column_file(cache_dir, field, "offsets"), offsets)
+    np.save(_column_file(cache_dir, field, "blob"), blob)
+    return kind
+
+
+def project_records(records, fields) -> list[dict]:
+    """只保留 fields 中的字段（点号路径作为输出键，缺失字段不输出）。"""
+    paths = [(f, tuple(f.split("."))) for f in fields]
+    out = []
+    for rec in records:
+        row = {}
+        for name, keys in paths:
+            v = _get_path(rec, keys)
+            if v is not _MISSING:
+                row[name] = v
+        out.append(row)
+    return out
+
+
+def project_rows(ds: ColumnarDataset, fields, start: int, end: int) -> list[dict]:
+    """直接从列文件组装 [start, end) 行的投影记录，不读取源 JSONL。"""
+    cols = [(f, ds.column(f)) for f in fields]
+    out = []
+    for i in range(start, end):
+        row = {}
+        for name, col in cols:
+            if col.present[i]:
+                row[name] = col[i]
+        out.append(row)
+    return out
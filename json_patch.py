@@ -0,0 +1,185 @@
+"""
+批量 JSON Patch（KS_Json_Patch 使用），操作格式参照 RFC 6902：
+    {"op": "add" | "replace" | "append" | "remove", "path": "/a/b/0" 或 "a.b.0", "value": ...}
+- path 以 "/" 开头时按 JSON Pointer（RFC 6901，~1 表示 /，~0 表示 ~）解析，否则按点号路径解析；
+  空字符串表示整个文档；
+- add：对象上设置成员（不存在的中间层自动创建为 {}），数组上按下标插入，"-" 表示末尾；
+- replace / remove：目标必须存在；
+- append：沿用 KS_Json_Key_Replace_3ways 的追加规则（目标为数组时扩展，非数组时与原值合并为数组，
+  不存在时直接设置；value 不是数组时视为单元素数组）。
+编译后的 Patch 可对多条记录重复使用：所有操作的父路径前缀在编译时去重编号，应用时已解析的前缀容器
+按编号缓存，共享前缀的操作只下钻一次；某个操作修改了容器后，只使其下方的前缀缓存失效，
+因此结果与逐条顺序执行完全相同。
+"""
+from functools import lru_cache
+
+from . import json_codec
+
+_OPS = ("add", "replace", "append", "remove")
+_CONTAINERS = (dict, list)
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _split_path(path: str) -> tuple:
+    if not path:
+        return ()
+    if path.startswith("/"):
+        return tuple(t.replace("~1", "/").replace("~0", "~") for t in path[1:].split("/"))
+    return tuple(path.split("."))
+
+
+def _copy_value(value):
+    """每次插入都使用新副本，同一 Patch 应用到多条记录时各记录之间不共享可变对象。"""
+    if isinstance(value, dict):
+        return {k: _copy_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(v) for v in value]
+    return value
+
+
+def _list_index(container, token, path, allow_end):
+    if token == "-" and allow_end:
+        return len(container)
+    try:
+        i = int(token)
+    except ValueError:
+        raise PatchError(f"invalid array index {token!r} in {path!r}")
+    if i < 0 or i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"array index {i} out of range in {path!r}")
+    return i
+
+
+class Patch:
+    def __init__(self, ops):
+        if not isinstance(ops, list):
+            raise PatchError("patch must be a JSON array of operations")
+        # 前缀编号：0 为文档根；_prefixes[i] = (父前缀编号, token)
+        self._prefixes = [(None, None)]
+        ids = {(): 0}
+        parsed = []
+        for n, op in enumerate(ops):
+            if not isinstance(op, dict) or op.get("op") not in _OPS:
+                raise PatchError(f"operation {n}: op must be one of {', '.join(_OPS)}")
+            if op["op"] != "remove" and "value" not in op:
+                raise PatchError(f"operation {n}: missing value")
+            path = str(op.get("path", ""))
+            tokens = _split_path(path)
+            for depth in range(1, len(tokens)):
+                prefix = tokens[:depth]
+                if prefix not in ids:
+                    ids[prefix] = len(self._prefixes)
+                    self._prefixes.append((ids[prefix[:-1]], prefix[-1]))
+            parsed.append((op["op"], path, tokens, op.get("value")))
+
+        self._ops = []
+        for kind, path, tokens, value in parsed:
+            parent = tokens[:-1]
+            # 修改父容器后失效的缓存：父路径之下的所有前缀（数组插入/删除会移动后续下标）；
+            # 根路径操作替换整个文档，除根以外全部失效
+            stale = tuple(i for p, i in ids.items() if len(p) > len(parent) and p[:len(parent)] == parent)
+            self._ops.append((kind, path, ids[parent] if tokens else None,
+                              tokens[-1] if tokens else None, value, stale))
+
+    def _resolve(self, doc, cache, pid, create, path):
+        node = cache[pid]
+        if node is not None:
+            return node
+        parent_id, token = self._prefixes[pid]
+        parent = self._resolve(doc, cache, parent_id, create, path)
+        if isinstance(parent, dict):
+            if token not in parent:
+                if not create:
+                    raise PatchError(f"path {path!r} does not exist")
+                parent[token] = {}
+            node = parent[token]
+        elif isinstance(parent, list):
+            node = parent[_list_index(parent, token, path, False)]
+        else:
+            raise PatchError(f"path {path!r} does not exist")
+        if not isinstance(node, _CONTAINERS):
+            raise PatchError(f"path {path!r} passes through a non-container value")
+        cache[pid] = node
+        return node
+
+    def apply(self, doc, strict=True):
+        """
+        原地应用到 doc（需为可变结构）并返回结果文档（整个文档被替换时返回新值）。
+        strict=False 时跳过目标不存在等无法执行的操作，否则抛出 PatchError。
+        """
+        cache = [None] * len(self._prefixes)
+        cache[0] = doc
+        for kind, path, parent_id, token, value, stale in self._ops:
+            try:
+                if parent_id is None:
+                    # 根路径：add / replace 替换整个文档，append 与 remove 不支持
+                    if kind in ("add", "replace"):
+                        doc = cache[0] = _copy_value(value)
+                        for i in stale:
+                            cache[i] = None
+                        continue
+                    raise PatchError(f"{kind} is not supported on the document root")
+                parent = self._resolve(doc, cache, parent_id, kind in ("add", "append"), path)
+                self._apply_one(parent, kind, token, value, path)
+            except PatchError:
+                if strict:
+                    raise
+                continue
+            for i in stale:
+                cache[i] = None
+        return doc
+
+    def _apply_one(self, parent, kind, token, value, path):
+        if isinstance(parent, list):
+            if kind == "add":
+                parent.insert(_list_index(parent, token, path, True), _copy_value(value))
+                return
+            if kind == "append" and token == "-":
+                parent.append(_copy_value(value))
+                return
+            i = _list_index(parent, token, path, False)
+            if kind == "remove":
+                del parent[i]
+            elif kind == "replace":
+                parent[i] = _copy_value(value)
+            else:
+                parent[i] = _appended(parent[i], value)
+            return
+
+        if not isinstance(parent, dict):
+            raise PatchError(f"path {path!r} does not exist")
+        if kind == "add":
+            parent[token] = _copy_value(value)
+        elif kind == "append":
+            parent[token] = _appended(parent[token], value) if token in parent else _as_list(value)
+        elif token not in parent:
+            raise PatchError(f"path {path!r} does not exist")
+        elif kind == "replace":
+            parent[token] = _copy_value(value)
+        else:
+            del parent[token]
+
+
+def _as_list(value):
+    return _copy_value(value) if isinstance(value, list) else [_copy_value(value)]
+
+
+def _appended(current, value):
+    if isinstance(current, list):
+        current.extend(_as_list(value))
+        return current
+    return [current] + _as_list(value)
+
+
+@lru_cache(maxsize=64)
+def _compile(text: str) -> Patch:
+    return Patch(json_codec.loads(text))
+
+
+def compile_patch(patch) -> Patch:
+    """编译补丁（JSON 文本按内容缓存，已解析的操作列表直接编译）。"""
+    if isinstance(patch, str):
+        return _compile(patch.strip() or "[]")
+    return Patch(patch)
@@ -0,0 +1,287 @@
+"""
+KS_Json_Query 使用的小型查询语言（jq 风格的管道），表达式只编译一次并缓存执行计划。
+
+语法：用 | 串联若干阶段，对每条记录一次遍历依次执行：
+  select(<条件>)        过滤
+  {a, b.c}              投影（输出键为路径字符串）
+  limit(n)              最多输出 n 条，达到后提前结束遍历
+条件：
+  .path == / != / < / <= / > / >= 字面量     （数字与数值字段比较时先 float 转换，与 Float_Range_Filter 一致）
+  .path in [lo, hi]                         （闭区间数值范围）
+  .path contains "kw"                       （不区分大小写的子串匹配；列表字段任一元素匹配即可）
+  and / or / not / 括号
+路径以点号分隔，开头的点可省略；字符串可用单引号或双引号。
+示例：
+  select(.click_rate in [0.2, 1] and .prompt contains "girl" and not .prompt contains "cat") | {prompt, uid} | limit(100)
+"""
+import re
+from functools import lru_cache
+
+from . import json_codec
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<dstring>"(?:[^"\\]|\\.)*")
+  | (?P<sstring>'(?:[^'\\]|\\.)*')
+  | (?P<path>\.?[^\W\d]\w*(?:\.\w+)*|\.)
+  | (?P<op>==|!=|<=|>=|<|>|\(|\)|\[|\]|\{|\}|,|\|)
+""", re.VERBOSE)
+
+_KEYWORDS = {"select", "limit", "and", "or", "not", "contains", "in", "true", "false", "null"}
+_KIND_NAMES = {"lit": "字面量", "path": "字段路径", "end": "表达式结尾"}
+_MISSING = object()
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def _tokenize(expr: str):
+    tokens = []
+    pos = 0
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if m is None:
+            raise QuerySyntaxError(f"无法识别的字符 {expr[pos]!r}（位置 {pos}）")
+        kind = m.lastgroup
+        text = m.group()
+        if kind == "number":
+            tokens.append(("lit", float(text) if any(c in text for c in ".eE") else int(text), pos))
+        elif kind == "dstring":
+            tokens.append(("lit", json_codec.loads(text), pos))
+        elif kind == "sstring":
+            tokens.append(("lit", re.sub(r"\\(.)", r"\1", text[1:-1]), pos))
+        elif kind == "path":
+            if text in _KEYWORDS:
+                if text in ("true", "false", "null"):
+                    tokens.append(("lit", {"true": True, "false": False, "null": None}[text], pos))
+                else:
+                    tokens.append(("kw", text, pos))
+            else:
+                keys = tuple(k for k in text.split(".") if k)
+                tokens.append(("path", keys, pos))
+        elif kind == "op":
+            tokens.append(("op", text, pos))
+        pos = m.end()
+    tokens.append(("end", None, pos))
+    return tokens
+
+
+def _make_getter(keys):
+    if not keys:
+        return lambda rec: rec
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda rec: rec.get(key, _MISSING) if isinstance(rec, dict) else _MISSING
+
+    def get(rec):
+        cur = rec
+        for k in keys:
+            if not isinstance(cur, dict) or k not in cur:
+                return _MISSING
+            cur = cur[k]
+        return cur
+    return get
+
+
+def _value_or_none(v):
+    return None if v is _MISSING else v
+
+
+def _to_float(v):
+    if v is _MISSING or v is None or isinstance(v, (dict, list)):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+_NUM_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class _Parser:
+    def __init__(self, expr: str):
+        self.tokens = _tokenize(expr)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i]
+
+    def next(self):
+        tok = self.tokens[self.i]
+        self.i += 1
+        return tok
+
+    def expect(self, kind, value=None):
+        tok = self.next()
+        if tok[0] != kind or (value is not None and tok[1] != value):
+            want = value if value is not None else _KIND_NAMES.get(kind, kind)
+            raise QuerySyntaxError(f"位置 {tok[2]} 处应为 {want!r}，实际为 {tok[1]!r}")
+        return tok
+
+    def accept(self, kind, value):
+        tok = self.peek()
+        if tok[0] == kind and tok[1] == value:
+            self.i += 1
+            return True
+        return False
+
+    # ---- 管道 ----
+    def parse_pipeline(self):
+        stages = [self.parse_stage()]
+        while self.accept("op", "|"):
+            stages.append(self.parse_stage())
+        self.expect("end")
+        return stages
+
+    def parse_stage(self):
+        tok = self.peek()
+        if tok[0] == "kw" and tok[1] == "select":
+            self.next()
+            self.expect("op", "(")
+            pred = self.parse_or()
+            self.expect("op", ")")
+            return ("select", pred)
+        if tok[0] == "kw" and tok[1] == "limit":
+            self.next()
+            self.expect("op", "(")
+            n = self.expect("lit")[1]
+            self.expect("op", ")")
+            if not isinstance(n, int) or n < 0:
+                raise QuerySyntaxError(f"limit 需要非负整数，实际为 {n!r}")
+            return ("limit", n)
+        if tok[0] == "op" and tok[1] == "{":
+            self.next()
+            fields = [self.expect("path")[1]]
+            while self.accept("op", ","):
+                fields.append(self.expect("path")[1])
+            self.expect("op", "}")
+            return ("project", [(".".join(keys), _make_getter(keys)) for keys in fields])
+        raise QuerySyntaxError(f"位置 {tok[2]} 处应为 select(...)、{{...}} 或 limit(...)")
+
+    # ---- 条件表达式 ----
+    def parse_or(self):
+        preds = [self.parse_and()]
+        while self.accept("kw", "or"):
+            preds.append(self.parse_and())
+        if len(preds) == 1:
+            return preds[0]
+        return lambda rec: any(p(rec) for p in preds)
+
+    def parse_and(self):
+        preds = [self.parse_not()]
+        while self.accept("kw", "and"):
+            preds.append(self.parse_not())
+        if len(preds) == 1:
+            return preds[0]
+        return lambda rec: all(p(rec) for p in preds)
+
+    def parse_not(self):
+        if self.accept("kw", "not"):
+            pred = self.parse_not()
+            return lambda rec: not pred(rec)
+        if self.accept("op", "("):
+            pred = self.parse_or()
+            self.expect("op", ")")
+            return pred
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        keys = self.expect("path")[1]
+        get = _make_getter(keys)
+        tok = self.next()
+
+        if tok[0] == "kw" and tok[1] == "contains":
+            kw = self.expect("lit")[1]
+            if not isinstance(kw, str):
+                raise QuerySyntaxError(f"contains 需要字符串，实际为 {kw!r}")
+            kw = kw.lower()
+
+            def contains(rec):
+                v = get(rec)
+                if isinstance(v, str):
+                    return kw in v.lower()
+                if isinstance(v, list):
+                    return any(isinstance(x, str) and kw in x.lower() for x in v)
+                return False
+            return contains
+
+        if tok[0] == "kw" and tok[1] == "in":
+            self.expect("op", "[")
+            lo = self.expect("lit")[1]
+            self.expect("op", ",")
+            hi = self.expect("lit")[1]
+            self.expect("op", "]")
+            lo, hi = _to_float(lo), _to_float(hi)
+            if lo is None or hi is None:
+                raise QuerySyntaxError("in [lo, hi] 需要数值范围")
+
+            def in_range(rec):
+                v = _to_float(get(rec))
+                return v is not None and lo <= v <= hi
+            return in_range
+
+        if tok[0] == "op" and tok[1] in _NUM_OPS:
+            op = _NUM_OPS[tok[1]]
+            lit = self.expect("lit")[1]
+            if isinstance(lit, (int, float)) and not isinstance(lit, bool):
+                lit = float(lit)
+
+                def num_cmp(rec):
+                    v = _to_float(get(rec))
+                    return v is not None and op(v, lit)
+                return num_cmp
+            if tok[1] not in ("==", "!="):
+                raise QuerySyntaxError(f"{tok[1]} 只能用于数值比较")
+
+            def eq_cmp(rec):
+                return op(_value_or_none(get(rec)), lit)
+            return eq_cmp
+
+        raise QuerySyntaxError(f"位置 {tok[2]} 处应为比较运算符、contains 或 in")
+
+
+class QueryPlan:
+    """编译后的执行计划：对记录序列单次遍历，依次执行各阶段。"""
+
+    def __init__(self, expr: str, stages):
+        self.expr = expr
+        self.stages = stages
+
+    def run(self, records) -> list:
+        stages = self.stages
+        passed = [0] * len(stages)
+        out = []
+        for rec in records:
+            for idx, (kind, arg) in enumerate(stages):
+                if kind == "select":
+                    if not arg(rec):
+                        break
+                elif kind == "project":
+                    rec = {name: _value_or_none(get(rec)) for name, get in arg}
+                else:
+                    # limit 已满：之后的记录都无法通过该阶段，提前结束遍历
+                    if passed[idx] >= arg:
+                        return out
+                    passed[idx] += 1
+            else:
+                out.append(rec)
+        return out
+
+
+@lru_cache(maxsize=256)
+def compile_query(expr: str) -> QueryPlan:
+    """编译查询表达式；相同表达式直接复用缓存的执行计划。"""
+    expr = (expr or "").strip()
+    if not expr:
+        return QueryPlan(expr, [])
+    return QueryPlan(expr, _Parser(expr).parse_pipeline())
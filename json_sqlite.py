@@ -0,0 +1,365 @@
+"""
+JSONL 的 SQLite 数据集引擎：把 JSONL 导入 <文件>.ksdb，关键词过滤与数值范围过滤下推为索引查询。
+- 文本键：每个键一张 FTS5 trigram 表，内容为该键（递归查找）所有值 str() 后以空格拼接并 lower() 的文本，
+  与 Array_Constrains_Filter 的匹配文本完全一致；关键词 >= 3 个字符时走 trigram 索引（短语 = 子串），
+  更短的关键词用 instr() 扫描该表；
+  特殊键 "*" 索引记录中的所有字符串叶子值（每个值一行拼接），供 Value_Eliminator 预筛候选记录；
+- 数值键：每个键一张 (id, value REAL) 表并在 value 上建 B-tree 索引，取值规则与 Float_Range_Filter 相同
+  （顶层键、float() 转换失败或 NaN 的记录不入表）；
+- 增量导入：记录已导入的字节位置与已导入部分头部、尾部的指纹，源文件只追加时只解析新增的行；
+  文件被截断/改写（包括大小不变的原地修改）或索引键变化时自动全量重建。
+"""
+import os
+import json
+import hashlib
+import sqlite3
+
+from . import json_codec
+from .json_ultis import _mmap_file
+from .append_writer import flush_path
+from .key_paths import find_key_values
+
+_SCHEMA_VERSION = 1
+_HEAD_BYTES = 65536
+_ALL_STRINGS = "*"
+
+
+def dataset_db_path(jsonl_path: str) -> str:
+    return jsonl_path + ".ksdb"
+
+
+def _string_leaves(data, out):
+    if isinstance(data, dict):
+        data = data.values()
+    for v in data:
+        if isinstance(v, str):
+            out.append(v)
+        elif isinstance(v, (dict, list)):
+            _string_leaves(v, out)
+    return out
+
+
+def _text_for_key(rec, key):
+    """返回该键的索引文本；记录中不存在该键时返回 None。"""
+    if key == _ALL_STRINGS:
+        leaves = _string_leaves(rec, [])
+        return "\n".join(leaves).lower() if leaves else None
+    found = find_key_values(rec, key)
+    if not found:
+        return None
+    return " ".join([str(v) for v in found]).lower()
+
+
+def _number_for_key(rec, key):
+    if key not in rec:
+        return None
+    try:
+        v = float(rec[key])
+    except Exception:
+        return None
+    return None if v != v else v
+
+
+def _head_digest(path: str, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(min(size, _HEAD_BYTES))).hexdigest()
+
+
+def _range_digest(path: str, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+
+def _match_phrase(kw: str) -> str:
+    return '"' + kw.replace('"', '""') + '"'
+
+
+class DatasetDB:
+    def __init__(self, jsonl_path: str, conn: sqlite3.Connection, meta: dict):
+        self.jsonl_path = jsonl_path
+        self.conn = conn
+        self.text_keys = meta["text_keys"]
+        self.numeric_keys = meta["numeric_keys"]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def has_text(self, key: str) -> bool:
+        return key in self.text_keys
+
+    def has_numeric(self, key: str) -> bool:
+        return key in self.numeric_keys
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    # ---- 查询构造：每个函数返回 (SELECT id 子查询, 参数列表) ----
+    def _text_table(self, key):
+        return f"text_{self.text_keys.index(key)}"
+
+    def _keyword_union(self, table, keywords):
+        parts, params = [], []
+        for kw in keywords:
+            if len(kw) >= 3:
+                parts.append(f"SELECT rowid FROM {table} WHERE {table} MATCH ?")
+                params.append(_match_phrase(kw))
+            else:
+                parts.append(f"SELECT rowid FROM {table} WHERE instr(value, ?) > 0")
+                params.append(kw)
+        return " UNION ".join(parts), params
+
+    def _keyword_intersect(self, table, keywords):
+        sql, params = self._keyword_union(table, keywords[:1])
+        for kw in keywords[1:]:
+            more_sql, more_params = self._keyword_union(table, [kw])
+            sql += " INTERSECT " + more_sql
+            params += more_params
+        return sql, params
+
+    def keyword_query(self, key, include, exclude):
+        """记录含 key，且（include 为空或命中任一 include），且不命中任何 exclude。"""
+        table = self._text_table(key)
+        sql, params = f"SELECT rowid FROM {table}", []
+        if include:
+            inc_sql, inc_params = self._keyword_union(table, include)
+            sql += f" INTERSECT SELECT * FROM ({inc_sql})"
+            params += inc_params
+        if exclude:
+            exc_sql, exc_params = self._keyword_union(table, exclude)
+            sql += f" EXCEPT SELECT * FROM ({exc_sql})"
+            params += exc_params
+        return sql, params
+
+    def strings_query(self, keywords, logic_and):
+        """字符串叶子中（任一/全部）包含关键词的候选记录（"*" 索引）。"""
+        table = self._text_table(_ALL_STRINGS)
+        if logic_and:
+            return self._keyword_intersect(table, keywords)
+        return self._keyword_union(table, keywords)
+
+    def range_query(self, key_ranges: dict):
+        """key_ranges: {key: [(lo, hi), ...]}，每个键至少命中一个闭区间。"""
+        parts, params = [], []
+        for key, ranges in key_ranges.items():
+            table = f"num_{self.numeric_keys.index(key)}"
+            cond = " OR ".join("value BETWEEN ? AND ?" for _ in ranges)
+            parts.append(f"SELECT id FROM {table} WHERE {cond}")
+            for lo, hi in ranges:
+                params += [lo, hi]
+        return " INTERSECT ".join(parts), params
+
+    def ids(self, sql, params) -> list[int]:
+        return [row[0] for row in self.conn.execute(f"SELECT * FROM ({sql}) ORDER BY 1", params)]
+
+    def fetch(self, sql=None, params=()) -> list:
+        """按文件顺序返回命中的记录（sql 为 None 时返回全部记录）。"""
+        if sql is None:
+            cur = self.conn.execute("SELECT data FROM records ORDER BY id")
+        else:
+            cur = self.conn.execute(f"SELECT data FROM records WHERE id IN ({sql}) ORDER BY id", params)
+        return [json_codec.loads(row[0]) for row in cur]
+
+    def iter_raw(self):
+        """按文件顺序返回 (id, 原始 JSON 行文本)。"""
+        return self.conn.execute("SELECT id, data FROM records ORDER BY id")
+
+
+def _read_meta(conn):
+    try:
+        rows = conn.execute("SELECT key, value FROM meta").fetchall()
+    except sqlite3.DatabaseError:
+        return None
+    meta = {k: json.loads(v) for k, v in rows}
+    if meta.get("version") != _SCHEMA_VERSION:
+        return None
+    return meta
+
+
+def _write_meta(conn, meta):
+    conn.executemany("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+                     [(k, json.dumps(v)) for k, v in meta.items()])
+
+
+def _create_schema(conn, text_keys, numeric_keys):
+    conn.execute("CREATE TABLE meta(key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE records(id INTEGER PRIMARY KEY, offset INTEGER NOT NULL, data TEXT NOT NULL)")
+    conn.execute("CREATE INDEX records_offset ON records(offset)")
+    for i in range(len(text_keys)):
+        conn.execute(f"CREATE VIRTUAL TABLE text_{i} USING fts5(value, tokenize='trigram case_sensitive 1')")
+    for i in range(len(numeric_keys)):
+        conn.execute(f"CREATE TABLE num_{i}(id INTEGER PRIMARY KEY, value REAL NOT NULL)")
+        conn.execute(f"CREATE INDEX num_{i}_value ON num_{i}(value)")
+
+
+def _ingest(conn, path, text_keys, numeric_keys, resume, next_id):
+    """从字节位置 resume 开始导入；返回 (下次导入的起始位置, 新增行数)。"""
+    text_rows = [[] for _ in text_keys]
+    num_rows = [[] for _ in numeric_keys]
+    records = []
+    with _mmap_file(path) as mm:
+        size = len(mm)
+        new_resume = size
+        pos = resume
+        while pos < size:
+            nl = mm.find(b"\n", pos)
+            line = mm[pos:size if nl == -1 else nl]
+            if line.strip():
+                try:
+                    rec = json_codec.loads(line)
+                except json.JSONDecodeError as e:
+                    raise Exception(f"Invalid JSON at byte {pos} in {path}: {str(e)}")
+                if not isinstance(rec, dict):
+                    raise ValueError(f"字节位置 {pos} 处的行不是合法 JSON 对象")
+                rid = next_id + len(records)
+                records.append((rid, pos, line.decode("utf-8")))
+                for rows, key in zip(text_rows, text_keys):
+                    text = _text_for_key(rec, key)
+                    if text is not None:
+                        rows.append((rid, text))
+                for rows, key in zip(num_rows, numeric_keys):
+                    v = _number_for_key(rec, key)
+                    if v is not None:
+                        rows.append((rid, v))
+            if nl == -1:
+                # 末行没有换行符：照常导入，但下次从该行开头重新导入（追加的内容可能接在这一行后面）
+                new_resume = pos
+                break
+            pos = nl + 1
+
+    conn.executemany("INSERT INTO records(id, offset, data) VALUES (?, ?, ?)", records)
+    for i, rows in enumerate(text_rows):
+        conn.executemany(f"INSERT INTO text_{i}(rowid, value) VALUES (?, ?)", rows)
+    for i, rows in enumerate(num_rows):
+        conn.executemany(f"INSERT INTO num_{i}(id, value) VALUES (?, ?)", rows)
+    return new_resume, len(records)
+
+
+def _drop_from(conn, meta, resume):
+    """删除起始位置 >= resume 的记录（上次未以换行结尾的末行），返回下一个可用 id。"""
+    row = conn.execute("SELECT MIN(id) FROM records WHERE offset >= ?", (resume,)).fetchone()
+    if row[0] is not None:
+        first = row[0]
+        conn.execute("DELETE FROM records WHERE id >= ?", (first,))
+        for i in range(len(meta["text_keys"])):
+            conn.execute(f"DELETE FROM text_{i} WHERE rowid >= ?", (first,))
+        for i in range(len(meta["numeric_keys"])):
+            conn.execute(f"DELETE FROM num_{i} WHERE id >= ?", (first,))
+    return (conn.execute("SELECT MAX(id) FROM records").fetchone()[0] or 0) + 1
+
+
+def _sync(conn, path, meta):
+    """
+    使数据库与源文件一致。返回新增行数；源文件不是在末尾追加（截断、改写）时返回 None，由调用方重建。
+    判断只追加的依据：大小未变时 mtime 也未变；大小增长时已导入部分的头部与尾部（resume 之前各
+    _HEAD_BYTES 字节）摘要均未变。
+    """
+    st = os.stat(path)
+    if st.st_size == meta["source_size"]:
+        # 大小不变而 mtime 变化视为原地改写（不是追加了 0 行）
+        return 0 if st.st_mtime_ns == meta["source_mtime_ns"] else None
+    resume = meta["resume"]
+    if (st.st_size < resume or "tail_sha1" not in meta
+            or _head_digest(path, meta["head_len"]) != meta["head_sha1"]
+            or _range_digest(path, meta["tail_start"], resume) != meta["tail_sha1"]):
+        return None
+    with conn:
+        next_id = _drop_from(conn, meta, resume)
+        resume, added = _ingest(conn, path, meta["text_keys"], meta["numeric_keys"], resume, next_id)
+        meta.update(resume=resume, source_size=st.st_size, source_mtime_ns=st.st_mtime_ns,
+                    head_len=min(resume, _HEAD_BYTES))
+        meta["head_sha1"] = _head_digest(path, meta["head_len"])
+        meta["tail_start"] = max(0, resume - _HEAD_BYTES)
+        meta["tail_sha1"] = _range_digest(path, meta["tail_start"], resume)
+        _write_meta(conn, meta)
+    return added
+
+
+def _build(path, text_keys, numeric_keys):
+    db_path = dataset_db_path(path)
+    tmp = db_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        meta = {"version": _SCHEMA_VERSION, "text_keys": text_keys, "numeric_keys": numeric_keys,
+                "resume": 0, "source_size": -1, "source_mtime_ns": -1, "head_len": 0,
+                "head_sha1": _head_digest(path, 0), "tail_start": 0, "tail_sha1": _range_digest(path, 0, 0)}
+        with conn:
+            _create_schema(conn, text_keys, numeric_keys)
+            _write_meta(conn, meta)
+        _sync(conn, path, meta)
+    finally:
+        conn.close()
+    os.replace(tmp, db_path)
+
+
+def ingest_jsonl(jsonl_path: str, text_keys, numeric_keys, rebuild: bool = False):
+    """
+    导入 / 增量更新 jsonl_path 对应的 .ksdb，返回 (总行数, 本次新增行数)。
+    索引键与已有数据库不同或 rebuild=True 时全量重建。
+    """
+    if not jsonl_path.lower().endswith(".jsonl") or not os.path.isfile(jsonl_path):
+        raise ValueError(f"{jsonl_path} 不是存在的 .jsonl 文件")
+    flush_path(jsonl_path)
+    text_keys = list(dict.fromkeys(k for k in text_keys if k))
+    numeric_keys = list(dict.fromkeys(k for k in numeric_keys if k))
+    db_path = dataset_db_path(jsonl_path)
+    if not rebuild and os.path.isfile(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            meta = _read_meta(conn)
+            if meta is not None and meta["text_keys"] == text_keys and meta["numeric_keys"] == numeric_keys:
+                added = _sync(conn, jsonl_path, meta)
+                if added is not None:
+                    return conn.execute("SELECT COUNT(*) FROM records").fetchone()[0], added
+        finally:
+            conn.close()
+    if os.path.isfile(db_path):
+        print(f"全量重建 {db_path}")
+    _build(jsonl_path, text_keys, numeric_keys)
+    conn = sqlite3.connect(db_path)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+    finally:
+        conn.close()
+    return total, total
+
+
+def open_dataset_db(jsonl_path: str):
+    """
+    打开 jsonl_path 已导入的 .ksdb 并先增量同步追加的行；没有数据库时返回 None。
+    源文件被改写时按原有索引键重建。同步 / 重建失败（如追加了不合法的行）时打印原因并返回 None，
+    由调用方退回普通解析路径（错误在那里按节点的方式报告）。调用方负责 close()（支持 with）。
+    """
+    if not jsonl_path or not jsonl_path.lower().endswith(".jsonl") or not os.path.isfile(jsonl_path):
+        return None
+    db_path = dataset_db_path(jsonl_path)
+    if not os.path.isfile(db_path):
+        return None
+    conn = None
+    try:
+        flush_path(jsonl_path)
+        conn = sqlite3.connect(db_path)
+        meta = _read_meta(conn)
+        if meta is None:
+            conn.close()
+            return None
+        if _sync(conn, jsonl_path, meta) is None:
+            conn.close()
+            print(f"{jsonl_path} 已被改写（非末尾追加），全量重建 {db_path}")
+            _build(jsonl_path, meta["text_keys"], meta["numeric_keys"])
+            conn = sqlite3.connect(db_path)
+            meta = _read_meta(conn)
+        return DatasetDB(jsonl_path, conn, meta)
+    except Exception as e:
+        if conn is not None:
+            conn.close()
+        print(f"数据集数据库 {db_path} 不可用，退回普通解析: {e}")
+        return None
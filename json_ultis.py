@@ -1,5 +1,12 @@
 import json
 import random
+import hashlib
+import math
+import mmap
+import pickle
+import struct
+import sys
+import threading
 import torch
 import time
 import datetime
@@ -7,11 +14,20 @@ from datetime import datetime
 import re
 import os
 import piexif
+import numpy as np
 from pathlib import Path
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from operator import itemgetter
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS, IFD
 from PIL.PngImagePlugin import PngImageFile
 from PIL.JpegImagePlugin import JpegImageFile
+from . import json_codec
+from .append_writer import flush_path
 
 
 def buildMetadata(image_path):
@@ -46,7 +62,7 @@ def buildMetadata(image_path):
             # from ComfyUI
             if k == "workflow":
                 try:
-                    metadata["workflow"] = json.loads(metadataFromImg["workflow"])
+                    metadata["workflow"] = json_codec.loads(metadataFromImg["workflow"])
                     workflow = metadata["workflow"]
                 except Exception as e:
                     print(f"Error parsing metadataFromImg 'workflow': {e}")
@@ -54,7 +70,7 @@ def buildMetadata(image_path):
             # from ComfyUI
             elif k == "prompt":
                 try:
-                    metadata["prompt"] = json.loads(metadataFromImg["prompt"])
+                    metadata["prompt"] = json_codec.loads(metadataFromImg["prompt"])
                     
                     prompt = metadata["prompt"]
                     
@@ -64,7 +80,7 @@ def buildMetadata(image_path):
             else:
                 try:
                     # for all possible metadataFromImg by user
-                    metadata[str(k)] = json.loads(v)
+                    metadata[str(k)] = json_codec.loads(v)
                 except Exception as e:
                     print(f"Error parsing {k} as json, trying as string: {e}")
                     try:
@@ -108,7 +124,7 @@ def process_exif_data(exif_data):
         prompt_data = prompt_data.replace('Prompt:', '', 1)
         # 假设 prompt_data 是一个字符串，尝试将其转换为 JSON 对象
         try:
-            metadata['prompt'] = json.loads(prompt_data)
+            metadata['prompt'] = json_codec.loads(prompt_data)
         except json.JSONDecodeError:
             metadata['prompt'] = prompt_data
 
@@ -119,7 +135,7 @@ def process_exif_data(exif_data):
         workflow_data = workflow_data.replace('Workflow:', '', 1)
         try:
             # 尝试将字节字符串转换为 JSON 对象
-            metadata['workflow'] = json.loads(workflow_data)
+            metadata['workflow'] = json_codec.loads(workflow_data)
         except json.JSONDecodeError:
             # 如果转换失败，则将原始字符串存储在 metadata 中
             metadata['workflow'] = workflow_data
@@ -128,27 +144,406 @@ def process_exif_data(exif_data):
     return metadata
 
 def read_jsonl_to_list_str(jsonl_path: str):
+    return list(iter_jsonl_records(jsonl_path))
+
+
+def iter_jsonl_records(jsonl_path: str):
+    """逐条产出 JSONL 记录（每次只解码一行，不在内存中保留整个文件的解析结果）。"""
     if not os.path.exists(jsonl_path) or not os.path.isfile(jsonl_path):
         raise Exception(f"JSONL file {jsonl_path} does not exist")
     if not jsonl_path.endswith(".jsonl"):
         raise Exception(f"File {jsonl_path} is not a .jsonl file")
 
-    items = []
-    with open(jsonl_path, "r", encoding="utf-8") as f:
-        for i, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
+    with _mmap_file(jsonl_path) as mm:
+        for i, line in _iter_mmap_lines(mm):
             try:
-                obj = json.loads(line)
+                obj = json_codec.loads(line)
             except json.JSONDecodeError:
                 raise Exception(f"Invalid JSON at line {i} in {jsonl_path}")
             if not isinstance(obj, dict):
                 raise Exception(f"Line {i} is not a JSON object")
-            items.append(obj)
-    return items
+            yield obj
+
+
+_NON_SPACE = re.compile(rb"\S")
+_UTF8_BOM = b"\xef\xbb\xbf"
+
+
+@contextmanager
+def _mmap_file(path: str):
+    """
+    以只读方式内存映射文件，产出可切片的缓冲区（空文件产出 b""，mmap 不支持长度为 0）。
+    本进程对该路径有缓冲中的追加内容时先落盘（见 append_writer.flush_path）。
+    """
+    flush_path(path)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _iter_mmap_lines(mm, start: int = 0, end: int = None):
+    """
+    在映射缓冲区 [start, end) 中按换行符逐行切分，每次只拷贝一行：
+    产出 (相对 start 的行号, 去首尾空白后的行 bytes)，跳过空行。
+    """
+    if mm[start:start + 3] == _UTF8_BOM:
+        start += 3
+    end = len(mm) if end is None else end
+    pos = start
+    line_no = 0
+    while pos < end:
+        nl = mm.find(b"\n", pos, end)
+        if nl == -1:
+            nl = end
+        line_no += 1
+        line = mm[pos:nl].strip()
+        pos = nl + 1
+        if line:
+            yield line_no, line
+
+
+# ---- 多进程分块解析 JSONL ----
+# 默认进程数（1 为串行），可被节点的 parse_workers 输入覆盖；小于阈值的文件始终串行解析
+_DEFAULT_PARSE_WORKERS = int(os.environ.get("KS_JSON_PARSE_WORKERS", "1"))
+_PARALLEL_MIN_BYTES = int(os.environ.get("KS_JSON_PARALLEL_MIN_MB", "64")) * 1024 * 1024
+_COUNT_CHUNK = 64 * 1024 * 1024
+
+
+def _count_newlines(mm, start: int, end: int) -> int:
+    count = 0
+    for pos in range(start, end, _COUNT_CHUNK):
+        count += mm[pos:min(pos + _COUNT_CHUNK, end)].count(b"\n")
+    return count
+
+
+def _resolve_parse_workers(workers) -> int:
+    """workers 为 None 或 0 时使用 KS_JSON_PARSE_WORKERS；结果限制在 [1, cpu_count]。"""
+    if not workers:
+        workers = _DEFAULT_PARSE_WORKERS
+    return max(1, min(int(workers), os.cpu_count() or 1))
+
+
+def _newline_aligned_ranges(mm, start: int, n_chunks: int) -> list[tuple[int, int]]:
+    """把 [start, len(mm)) 切成约 n_chunks 段，每段起点都紧跟在换行符之后。"""
+    size = len(mm)
+    step = max(1, (size - start) // n_chunks)
+    bounds = [start]
+    for k in range(1, n_chunks):
+        pos = max(start + k * step, bounds[-1])
+        nl = mm.find(b"\n", pos)
+        if nl == -1:
+            break
+        if nl + 1 > bounds[-1]:
+            bounds.append(nl + 1)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
 
-def _parse_json_maybe_jsonl(s: str) -> list[dict]:
+
+def _parse_jsonl_range(path: str, start: int, end: int):
+    """
+    进程池 worker：解析 [start, end) 字节范围内的 JSONL 行。
+    返回 (records, 0, "")；遇到无法解析或不是对象的行时返回 (None, 该行在本段内的行号, 原因)，
+    由主进程换算成全局行号后直接报错，其余分段的结果不再重新解析。
+    """
+    out = []
+    with _mmap_file(path) as mm:
+        for i, line in _iter_mmap_lines(mm, start, end):
+            try:
+                obj = json_codec.loads(line)
+            except json.JSONDecodeError as e:
+                return None, i, f"解析失败: {e}"
+            if not isinstance(obj, dict):
+                return None, i, "不是合法 JSON 对象"
+            out.append(obj)
+    return out, 0, ""
+
+
+def _parse_jsonl_parallel(path: str, mm, start: int, workers: int):
+    """
+    按换行对齐的字节范围并行解码 JSONL，按原始顺序合并；某行不合法时按全局行号抛出 ValueError。
+    返回 None 表示进程池不可用，需要退回串行路径。
+    """
+    ranges = _newline_aligned_ranges(mm, start, workers * 4)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parse_jsonl_range, path, a, b) for a, b in ranges]
+            results = [f.result() for f in futures]
+    except (BrokenProcessPool, OSError, ImportError, AttributeError, pickle.PicklingError) as e:
+        print(f"并行解析不可用，退回串行解析: {e}")
+        return None
+
+    out = []
+    for (a, _), (records, bad_line, reason) in zip(ranges, results):
+        if records is None:
+            # 与串行路径保持一致的全局行号
+            line_no = _count_newlines(mm, 0, a) + bad_line
+            raise ValueError(f"第 {line_no} 行{reason}")
+        out.extend(records)
+    return out
+
+
+def _parse_json_file(path: str, workers=None) -> list[dict]:
+    """
+    _parse_json_text 的文件版本：基于 mmap 读取，不产生整文件的 str 副本。
+    workers > 1 且文件足够大时，JSONL 使用多进程分块解析。
+    """
+    if not path.lower().endswith(('.txt', '.json', '.jsonl')):
+        raise ValueError(f"文件 {path} 扩展名不支持，仅支持 .txt, .json, .jsonl")
+    try:
+        with _mmap_file(path) as mm:
+            return _parse_json_buffer(mm, path, _resolve_parse_workers(workers))
+    except OSError as e:
+        raise IOError(f"读取文件 {path} 失败: {str(e)}")
+
+
+def _parse_json_buffer(mm, path: str = None, workers: int = 1) -> list[dict]:
+    """
+    - JSON 数组 / 单个对象：直接对映射缓冲区解码；
+    - JSONL：沿换行边界逐行解码，峰值内存约为解析结果加一行。
+    """
+    start = 3 if mm[:3] == _UTF8_BOM else 0
+    m = _NON_SPACE.search(mm, start)
+    if m is None:
+        return []
+    start = m.start()
+
+    # JSON 数组
+    if mm[start:start + 1] == b"[":
+        try:
+            data = json_codec.loads(mm[start:])
+            if not isinstance(data, list):
+                raise Exception("输入的字符串不是 JSON 数组")
+            return data
+        except json.JSONDecodeError as e:
+            raise Exception(f"解析 JSON 数组失败: {str(e)}")
+
+    # 尝试作为 JSONL 解析（去掉尾部空白后仍有换行才视为多行）
+    tail = len(mm)
+    while tail > start and mm[tail - 1:tail].isspace():
+        tail -= 1
+    first_nl = mm.find(b"\n", start, tail)
+    if first_nl != -1:
+        # 首行无法单独解码时不是 JSONL（如多行排版的单个对象），直接按单个对象解析；
+        # 首行可解码时按 JSONL 处理，之后任何一行不合法都带行号报错
+        try:
+            json_codec.loads(mm[start:first_nl].strip())
+            is_jsonl = True
+        except json.JSONDecodeError:
+            is_jsonl = False
+        if is_jsonl:
+            out = None
+            if workers > 1 and path and len(mm) >= _PARALLEL_MIN_BYTES:
+                out = _parse_jsonl_parallel(path, mm, start, workers)
+            if out is not None:
+                return out
+            out = []
+            for i, line in _iter_mmap_lines(mm):
+                try:
+                    obj = json_codec.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"第 {i} 行解析失败: {e}")
+                if not isinstance(obj, dict):
+                    raise ValueError(f"第 {i} 行不是合法 JSON 对象")
+                out.append(obj)
+            return out
+
+    # 尝试作为单个 JSON 对象解析
+    try:
+        obj = json_codec.loads(mm[start:])
+        if not isinstance(obj, dict):
+            raise ValueError("输入的 JSON 不是对象")
+        return [obj]
+    except json.JSONDecodeError as e:
+        raise ValueError(f"解析 JSON 对象失败: {str(e)}")
+
+
+class _FrozenDict(dict):
+    """缓存中共享的只读 dict，任何修改都会抛出 TypeError。"""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("cached JSON data is read-only, use _thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    # copy.deepcopy / pickle 通过 __setitem__ 重建对象，这里直接产出普通 dict
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class _FrozenList(list):
+    """缓存中共享的只读 list，任何修改都会抛出 TypeError。"""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("cached JSON data is read-only, use _thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    # copy.deepcopy / pickle 通过 append / extend 重建对象，这里直接产出普通 list
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return _FrozenList(_freeze(v) for v in obj)
+    return obj
+
+
+def _thaw(obj):
+    """
+    将缓存返回的只读结构深拷贝为普通 dict/list，供需要原地修改数据的节点使用。
+    """
+    if isinstance(obj, dict):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_thaw(v) for v in obj]
+    return obj
+
+
+def _estimate_size(obj) -> int:
+    """估算解析结果占用的内存字节数（容器与标量的 sys.getsizeof 之和，共享的键字符串会重复计入）。"""
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            for k, v in item.items():
+                total += sys.getsizeof(k)
+                stack.append(v)
+        elif isinstance(item, list):
+            stack.extend(item)
+    return total
+
+
+class _ParseCache:
+    """
+    进程级解析缓存（LRU，按调用方给出的字节数计预算；解析缓存按解析结果的估算内存计）：
+    - 文件输入以 (realpath, mtime, size) 为键，文件被修改后自动失效；
+    - 字符串输入以内容哈希为键；
+    - 缓存值为只读结构，多个节点共享同一份解析结果。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes: int):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# 缓存预算默认 1024 MB（解析结果的估算内存），可通过环境变量 KS_JSON_CACHE_MB 调整（0 表示关闭缓存）
+_PARSE_CACHE = _ParseCache(int(os.environ.get("KS_JSON_CACHE_MB", "1024")) * 1024 * 1024)
+
+
+def parse_cache_stats() -> dict:
+    """返回解析缓存的命中/未命中/淘汰计数及当前占用字节数。"""
+    return _PARSE_CACHE.stats()
+
+
+def clear_parse_cache():
+    _PARSE_CACHE.clear()
+
+
+def _source_key(s: str):
+    """
+    返回 (缓存键, 源数据字节数)：文件为 ("file", realpath, mtime_ns, size)，
+    其他字符串为 ("str", 内容 sha1)。s 需已去除首尾空白。
+    """
+    if os.path.exists(s) and os.path.isfile(s):
+        flush_path(s)  # 缓冲中的追加内容先落盘，缓存键反映文件的实际内容
+        st = os.stat(s)
+        return ("file", os.path.realpath(s), st.st_mtime_ns, st.st_size), st.st_size
+    raw = s.encode("utf-8", errors="surrogatepass")
+    return ("str", hashlib.sha1(raw).hexdigest()), len(raw)
+
+
+def _parse_json_maybe_jsonl(s: str, workers=None) -> list[dict]:
+    """
+    带缓存的 _parse_json_text：相同文件（路径、mtime、大小不变）或相同字符串内容
+    只解析一次，返回只读结构（需要修改时先调用 _thaw）。
+    workers: 大 JSONL 文件的解析进程数，None/0 表示使用 KS_JSON_PARSE_WORKERS。
+    """
+    if not isinstance(s, str):
+        raise TypeError("输入必须是字符串类型")
+
+    s = (s or "").strip()
+    if not s:
+        return []
+
+    key, _ = _source_key(s)
+    cached = _PARSE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    if key[0] == "file":
+        data = _freeze(_parse_json_file(s, workers))
+    else:
+        data = _freeze(_parse_json_text(s))
+    # 预算按解析结果的估算内存计，而不是源数据字节数
+    _PARSE_CACHE.put(key, data, _estimate_size(data))
+    return data
+
+
+def _parse_json_text(s: str) -> list[dict]:
     """
     支持三种输入：
     1) JSON 数组字符串:   "[{...},{...}]"
@@ -166,16 +561,10 @@ def _parse_json_maybe_jsonl(s: str) -> list[dict]:
     if not s:
         return []
 
-    # 1. 判断是否是文件路径
+    # 1. 判断是否是文件路径（文件走 mmap 逐行读取，避免整文件字符串拷贝）
     if os.path.exists(s) and os.path.isfile(s):
-        if not s.lower().endswith(('.txt', '.json', '.jsonl')):
-            raise ValueError(f"文件 {s} 扩展名不支持，仅支持 .txt, .json, .jsonl")
-        try:
-            with open(s, 'r', encoding='utf-8') as f:
-                s = f.read().strip()
-        except Exception as e:
-            raise IOError(f"读取文件 {s} 失败: {str(e)}")
-        
+        return _parse_json_file(s)
+
     # 统一处理编码
     if isinstance(s, (bytes, bytearray)):
         s = s.decode('utf-8', errors='replace')
@@ -183,7 +572,7 @@ def _parse_json_maybe_jsonl(s: str) -> list[dict]:
     # JSON 数组
     if s.startswith("["):
         try:
-            data = json.loads(s)
+            data = json_codec.loads(s)
             if not isinstance(data, list):
                 raise Exception("输入的字符串不是 JSON 数组")
             return data
@@ -191,31 +580,251 @@ def _parse_json_maybe_jsonl(s: str) -> list[dict]:
             raise Exception(f"解析 JSON 数组失败: {str(e)}")
 
     # 3. 尝试作为 JSONL 解析
+    #    首行无法解码时视为单个对象（多行排版），否则任何一行不合法都带行号报错
     if "\n" in s:
-        try:
-            out = []
-            for i, line in enumerate(s.splitlines(), 1):
-                line = line.strip()
-                if not line:
-                    continue
-                obj = json.loads(line)
-                if not isinstance(obj, dict):
-                    raise ValueError(f"第 {i} 行不是合法 JSON 对象")
-                out.append(obj)
-            if out:  # 如果成功解析出至少一个对象
-                return out
-        except json.JSONDecodeError:
-            pass  # JSONL 解析失败，继续尝试作为单个 JSON 对象解析
+        out = []
+        for i, line in enumerate(s.splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json_codec.loads(line)
+            except json.JSONDecodeError as e:
+                if not out:
+                    break
+                raise ValueError(f"第 {i} 行解析失败: {e}")
+            if not isinstance(obj, dict):
+                raise ValueError(f"第 {i} 行不是合法 JSON 对象")
+            out.append(obj)
+        else:
+            return out
 
     # 4. 尝试作为单个 JSON 对象解析
     try:
-        obj = json.loads(s)
+        obj = json_codec.loads(s)
         if not isinstance(obj, dict):
             raise ValueError("输入的 JSON 不是对象")
         return [obj]
     except json.JSONDecodeError as e:
         raise ValueError(f"解析 JSON 对象失败: {str(e)}")
     
+# ---- JSONL 行偏移索引（sidecar 文件） ----
+# 格式：头部 (magic, mtime_ns, size, 行数) + 每个非空行起始字节偏移（uint64 小端）
+_LINE_INDEX_MAGIC = b"KSIDX001"
+_LINE_INDEX_HEADER = struct.Struct("<8sqQQ")
+_LINE_INDEX_ENTRY = struct.Struct("<Q")
+# sidecar 无法写入（如只读目录）时退化为进程内索引：realpath -> (mtime_ns, size, offsets)
+_LINE_INDEX_MEMO = {}
+
+
+def _line_index_path(jsonl_path: str) -> str:
+    return jsonl_path + ".ksidx"
+
+
+def _build_line_offsets(jsonl_path: str) -> array:
+    """扫描一遍文件，记录每个非空行的起始字节偏移。"""
+    offsets = array("Q")
+    pos = 0
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                offsets.append(pos)
+            pos += len(line)
+    return offsets
+
+
+def _read_line_index_header(index_path: str, st):
+    """sidecar 有效时返回行数，否则返回 None。"""
+    try:
+        with open(index_path, "rb") as f:
+            header = f.read(_LINE_INDEX_HEADER.size)
+    except OSError:
+        return None
+    if len(header) != _LINE_INDEX_HEADER.size:
+        return None
+    magic, mtime_ns, size, n = _LINE_INDEX_HEADER.unpack(header)
+    if magic != _LINE_INDEX_MAGIC or mtime_ns != st.st_mtime_ns or size != st.st_size:
+        return None
+    return n
+
+
+def _ensure_line_index(jsonl_path: str):
+    """
+    确保 jsonl_path 的行偏移索引存在且与当前文件一致（mtime、size 变化则重建）。
+    返回 (index_path, offsets, n)：sidecar 可用时 offsets 为 None，否则 index_path 为 None。
+    """
+    flush_path(jsonl_path)
+    st = os.stat(jsonl_path)
+    index_path = _line_index_path(jsonl_path)
+    n = _read_line_index_header(index_path, st)
+    if n is not None:
+        return index_path, None, n
+
+    real = os.path.realpath(jsonl_path)
+    memo = _LINE_INDEX_MEMO.get(real)
+    if memo is not None and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+        return None, memo[2], len(memo[2])
+
+    offsets = _build_line_offsets(jsonl_path)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_LINE_INDEX_HEADER.pack(_LINE_INDEX_MAGIC, st.st_mtime_ns, st.st_size, len(offsets)))
+            offsets.tofile(f)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        _LINE_INDEX_MEMO[real] = (st.st_mtime_ns, st.st_size, offsets)
+        return None, offsets, len(offsets)
+    _LINE_INDEX_MEMO.pop(real, None)
+    return index_path, None, len(offsets)
+
+
+def read_jsonl_slice(jsonl_path: str, start: int, count: int):
+    """
+    通过行偏移索引读取 JSONL 文件中第 start 条起的 count 条记录（count < 0 表示到末尾），
+    只解码被选中的行。返回 (items, total)。
+    """
+    index_path, offsets, n = _ensure_line_index(jsonl_path)
+    end = start + count
+    if count < 0 or end > n:
+        end = n
+    if start < 0 or start > end:
+        raise Exception(f"Invalid range: start={start}, end={end}, total={n}")
+    if start == end:
+        return [], n
+
+    if offsets is not None:
+        first = offsets[start]
+    else:
+        with open(index_path, "rb") as f:
+            f.seek(_LINE_INDEX_HEADER.size + start * _LINE_INDEX_ENTRY.size)
+            first = _LINE_INDEX_ENTRY.unpack(f.read(_LINE_INDEX_ENTRY.size))[0]
+
+    items = []
+    line_no = start
+    with open(jsonl_path, "rb") as f:
+        f.seek(first)
+        while len(items) < end - start:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            line_no += 1
+            try:
+                obj = json_codec.loads(line)
+            except json.JSONDecodeError as e:
+                raise Exception(f"Invalid JSON at record {line_no} in {jsonl_path}: {str(e)}")
+            if not isinstance(obj, dict):
+                raise ValueError(f"第 {line_no} 条记录不是合法 JSON 对象")
+            items.append(obj)
+    return items, n
+
+
+# ---- 免解析计数（KS_Json_Count） ----
+# 结构扫描只识别字符串与结构符号，数字 / true / false / null 直接跳过，不构建任何对象
+_STRUCT_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{},]')
+# 两个换行之间只有空白的行（lookahead 不消耗后一个换行，连续空行都能匹配）
+_BLANK_LINE = re.compile(rb"\n[ \t\r\f\v]*(?=\n)")
+# realpath -> (mtime_ns, size, count)
+_COUNT_MEMO = {}
+
+
+def _count_nonblank_lines(mm, start: int) -> int:
+    """
+    按 _COUNT_CHUNK 分块扫描换行，统计非空行数（与 _iter_mmap_lines 产出的行数一致），内存占用恒定。
+    """
+    count = 0
+    pending = False  # 跨块的未结束行中是否已出现非空白字符
+    for pos in range(start, len(mm), _COUNT_CHUNK):
+        chunk = mm[pos:pos + _COUNT_CHUNK]
+        first = chunk.find(b"\n")
+        if first == -1:
+            pending = pending or _NON_SPACE.search(chunk) is not None
+            continue
+        if pending or _NON_SPACE.search(chunk, 0, first) is not None:
+            count += 1
+        last = chunk.rfind(b"\n")
+        if last > first:
+            lines = chunk.count(b"\n", first + 1, last + 1)
+            count += lines - len(_BLANK_LINE.findall(chunk, first, last + 1))
+        pending = _NON_SPACE.search(chunk, last + 1) is not None
+    return count + pending
+
+
+def _scan_top_level(mm, start: int):
+    """
+    从 start 处的 [ 或 { 开始做结构扫描，返回 (顶层元素数, 顶层值结束后的偏移)；
+    顶层为对象时元素数记为 1（与解析结果 [obj] 一致）。值未闭合时返回 None。
+    只跟踪括号深度，不校验 JSON 语法。
+    """
+    is_array = mm[start:start + 1] == b"["
+    depth = commas = 0
+    for m in _STRUCT_TOKEN.finditer(mm, start):
+        c = mm[m.start():m.start() + 1]
+        if c == b'"':
+            continue
+        if c in b"[{":
+            depth += 1
+        elif c in b"]}":
+            depth -= 1
+            if depth == 0:
+                if not is_array:
+                    return 1, m.end()
+                if commas:
+                    return commas + 1, m.end()
+                return (1 if _NON_SPACE.search(mm, start + 1, m.start()) else 0), m.end()
+        elif depth == 1:
+            commas += 1
+    return None
+
+
+def count_json_file(path: str):
+    """
+    不解析记录地统计文件中的记录数，结果与 len(_parse_json_maybe_jsonl(path)) 相同：
+    - JSON 数组：结构扫描顶层元素；
+    - 单个 JSON 对象：1；
+    - JSONL（首个对象之后还有内容）：分块统计非空行，若已有有效的行偏移索引则直接读取其头部。
+    结果按 (realpath, mtime, size) 缓存。无法确定（扩展名不支持、结构不完整、数组后有多余内容等
+    解析会报错的情况）时返回 None，由调用方走完整解析路径以获得原有的错误信息。
+    """
+    if not path.lower().endswith(('.txt', '.json', '.jsonl')):
+        return None
+    flush_path(path)
+    st = os.stat(path)
+    real = os.path.realpath(path)
+    memo = _COUNT_MEMO.get(real)
+    if memo is not None and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+        return memo[2]
+
+    with _mmap_file(path) as mm:
+        start = 3 if mm[:3] == _UTF8_BOM else 0
+        m = _NON_SPACE.search(mm, start)
+        if m is None:
+            count = 0
+        else:
+            start = m.start()
+            if mm[start:start + 1] not in (b"[", b"{"):
+                return None
+            scanned = _scan_top_level(mm, start)
+            if scanned is None:
+                return None
+            count, end = scanned
+            if _NON_SPACE.search(mm, end) is not None:
+                if mm[start:start + 1] == b"[":
+                    return None
+                count = _read_line_index_header(_line_index_path(path), st)
+                if count is None:
+                    count = _count_nonblank_lines(mm, 0)
+    _COUNT_MEMO[real] = (st.st_mtime_ns, st.st_size, count)
+    return count
+
+
 def parse_data(data, target_object):
     """
     根据 target_object 自动处理 JSON 数据：
@@ -240,3 +849,33 @@ def parse_data(data, target_object):
         else:
             raise ValueError("Error: Input JSON is neither a dict nor a list.")
 
+
+def _float_or_nan(item, key) -> float:
+    if isinstance(item, dict) and key in item:
+        try:
+            return float(item[key])
+        except Exception:
+            return math.nan
+    return math.nan
+
+
+def extract_float_column(items, key) -> np.ndarray:
+    """
+    一次遍历把每条记录的 key 字段提取为 float64 数组。
+    缺失、非 dict 或无法转换为 float 的记录记为 NaN（NaN 与任何范围比较都为 False，
+    等价于逐条 try float() 失败后跳过）；np.isnan 即为无效掩码。
+    """
+    n = len(items)
+    try:
+        # 常见情况：所有记录都有该字段且为数值，map + itemgetter 全程在 C 层完成
+        return np.fromiter(map(itemgetter(key), items), dtype=np.float64, count=n)
+    except (KeyError, IndexError, TypeError, ValueError, OverflowError):
+        return np.fromiter((_float_or_nan(item, key) for item in items), dtype=np.float64, count=n)
+
+
+def range_mask(values: np.ndarray, ranges) -> np.ndarray:
+    """values 落在任一闭区间 [lo, hi] 内的布尔掩码（NaN 恒为 False）。"""
+    mask = np.zeros(values.shape, dtype=bool)
+    for lo, hi in ranges:
+        mask |= (values >= lo) & (values <= hi)
+    return mask
@@ -0,0 +1,160 @@
+"""
+文档级键位置索引（KS_JsonKeyExtractor / KS_JsonKeyReplacer 使用）。
+- 每份文档只解析、遍历一次：建立 键名 -> [具体路径, ...] 的索引，路径为键 / 下标组成的 tuple；
+  之后同一文档换不同键名提取、检查唯一性、替换都只是查表；
+- 字符串输入按内容哈希缓存，上游 JSON 对象按对象身份缓存（缓存项中保留引用并校验）；
+- 缓存中的文档为只读结构。替换时只复制根到被替换键之间的容器（其余子树共享），
+  新文档的索引由旧索引打补丁得到：删去被替换值内部的路径，加入新值内部的路径，不整体重建。
+  替换结果同样登记到缓存（按对象身份与序列化文本），链式替换 / 提取可直接命中；替换结果本身即只读文档，
+  直接作为 JSON 输出交给下游（需要修改的节点自行 _thaw），不整体复制。
+"""
+import hashlib
+import os
+
+from . import json_codec
+from .json_ultis import _ParseCache, _FrozenDict, _FrozenList, _freeze
+
+# 索引缓存预算默认 256 MB（按文档字节数估算），可通过环境变量 KS_JSON_KEY_INDEX_CACHE_MB 调整（0 表示关闭）
+_INDEX_CACHE = _ParseCache(int(os.environ.get("KS_JSON_KEY_INDEX_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def _index_into(obj, prefix, keys):
+    """先序遍历（与递归查找顺序一致：先记录键，再进入该键的值），把每个键的路径追加到 keys。"""
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            path = prefix + (k,)
+            keys.setdefault(k, []).append(path)
+            if isinstance(v, (dict, list)):
+                _index_into(v, path, keys)
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            if isinstance(v, (dict, list)):
+                _index_into(v, prefix + (i,), keys)
+    return keys
+
+
+def _set_path(node, path, depth, value):
+    """返回把 path 处的值换成 value 后的新结构：只复制沿途容器，其余子树与原文档共享。"""
+    if depth == len(path):
+        return value
+    step = path[depth]
+    if isinstance(node, dict):
+        copy = dict(node)
+        copy[step] = _set_path(node[step], path, depth + 1, value)
+        return _FrozenDict(copy)
+    copy = list(node)
+    copy[step] = _set_path(node[step], path, depth + 1, value)
+    return _FrozenList(copy)
+
+
+def format_path(path) -> str:
+    """("a", 0, "b") -> "a[0].b"。"""
+    out = ""
+    for step in path:
+        if isinstance(step, int):
+            out += f"[{step}]"
+        else:
+            out = f"{out}.{step}" if out else step
+    return out
+
+
+class DocIndex:
+    __slots__ = ("doc", "keys", "nbytes")
+
+    def __init__(self, doc, keys, nbytes):
+        self.doc = doc      # 只读文档
+        self.keys = keys    # 键名 -> [路径 tuple, ...]（只读，替换时按键复制）
+        self.nbytes = nbytes
+
+    def locate(self, keyname) -> list:
+        return self.keys.get(keyname, [])
+
+    def get(self, path):
+        node = self.doc
+        for step in path:
+            node = node[step]
+        return node
+
+    def _precedes(self, a, b) -> bool:
+        """文档先序中路径 a 是否排在 b 之前（a 为 b 的祖先时也在前）；a 不能位于 b 之下。"""
+        for i, (x, y) in enumerate(zip(a, b)):
+            if x != y:
+                if isinstance(x, int):
+                    return x < y
+                for k in self.get(a[:i]):
+                    if k == x:
+                        return True
+                    if k == y:
+                        return False
+        return len(a) <= len(b)
+
+    def replace(self, path, value) -> "DocIndex":
+        """
+        返回 path 处的值替换为 value 后的新索引（value 需为只读结构），本索引不变。
+        新值内部的路径按文档先序插入到原子树路径所在的位置，结果与对新文档重新建索引相同。
+        """
+        n = len(path)
+        removed = _index_into(self.get(path), path, {})
+        added = _index_into(value, path, {})
+        keys = dict(self.keys)
+        for k in removed.keys() | added.keys():
+            paths = [p for p in keys.get(k, []) if not (len(p) > n and p[:n] == path)]
+            new = added.get(k)
+            if new:
+                lo, hi = 0, len(paths)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if self._precedes(paths[mid], path):
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                paths[lo:lo] = new
+            if paths:
+                keys[k] = paths
+            else:
+                keys.pop(k, None)
+        return DocIndex(_set_path(self.doc, path, 0, value), keys, self.nbytes)
+
+
+def _text_key(text: str):
+    return ("str", hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest())
+
+
+def get_doc_index(json_string, json_data=None) -> DocIndex:
+    """
+    返回文档的索引（缓存未命中时解析并建立）。json_data 非 None 时以该对象为文档，否则解析 json_string；
+    解析失败时抛出 json.JSONDecodeError。
+    """
+    if isinstance(json_data, str):
+        json_string, json_data = json_data, None
+    if json_data is not None:
+        key = ("obj", id(json_data))
+        entry = _INDEX_CACHE.get(key)
+        if entry is not None and entry[0] is json_data:
+            return entry[1]
+        doc = _freeze(json_data)
+        keys = _index_into(doc, (), {})
+        # 没有源文本时按路径数估算占用
+        index = DocIndex(doc, keys, 100 * sum(map(len, keys.values())) + 64)
+        _INDEX_CACHE.put(key, (json_data, index), index.nbytes)
+        return index
+
+    key = _text_key(json_string)
+    entry = _INDEX_CACHE.get(key)
+    if entry is not None:
+        return entry[1]
+    doc = _freeze(json_codec.loads(json_string))
+    index = DocIndex(doc, _index_into(doc, (), {}), 2 * len(json_string) + 64)
+    _INDEX_CACHE.put(key, (None, index), index.nbytes)
+    return index
+
+
+def register_doc_index(index: DocIndex, text: str = ""):
+    """登记替换得到的新文档：按对象身份（下游以 JSON 对象接收时命中），有序列化文本时再按文本哈希。"""
+    _INDEX_CACHE.put(("obj", id(index.doc)), (index.doc, index), index.nbytes)
+    if text:
+        _INDEX_CACHE.put(_text_key(text), (None, index), index.nbytes)
+
+
+def clear_key_index_cache():
+    _INDEX_CACHE.clear()
@@ -0,0 +1,145 @@
+"""
+按结构（schema）定位键：代替对每条记录整棵树的盲目递归查找。
+同一数据集的记录结构几乎相同：第一次遇到某种结构时完整遍历一次，同时推断出该结构的"骨架"
+（每层 dict 的键序列、哪些键是容器、keyname 出现在哪些位置），按 (keyname, 顶层键) 缓存；
+之后同结构的记录只沿骨架中的容器路径直接取值，标量部分只在 C 层用 map(type, ...) 校验仍是标量。
+记录与骨架不一致（键不同、标量变成容器等）时退回完整遍历，因此结果与递归查找完全一致。
+"""
+from collections import OrderedDict
+from operator import itemgetter
+
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+_MAX_SHAPES_PER_KEY = 4
+_MAX_CACHE_ENTRIES = 256
+
+
+class _Mismatch(Exception):
+    pass
+
+
+class _DictShape:
+    __slots__ = ("keys", "scalars", "plan")
+
+    def __init__(self, keys, scalar_keys, plan):
+        self.keys = keys                # 完整键序列（tuple）
+        # 取出所有标量值的 itemgetter（统一返回 tuple），没有标量键时为 None
+        if not scalar_keys:
+            self.scalars = None
+        elif len(scalar_keys) == 1:
+            key = scalar_keys[0]
+            self.scalars = lambda d: (d[key],)
+        else:
+            self.scalars = itemgetter(*scalar_keys)
+        self.plan = plan                # ((key, 是否为 keyname, 子骨架或 None), ...)，按键顺序
+
+
+class _ListShape:
+    __slots__ = ("elem",)
+
+    def __init__(self, elem):
+        self.elem = elem                # None 表示元素全是标量，否则每个元素都符合该骨架
+
+
+def _walk(obj, keyname, locs):
+    """完整递归遍历（原实现的顺序：先判断键，再进入该键的值）。"""
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k == keyname:
+                locs.append((obj, k))
+            if isinstance(v, (dict, list)):
+                _walk(v, keyname, locs)
+    elif isinstance(obj, list):
+        for item in obj:
+            if isinstance(item, (dict, list)):
+                _walk(item, keyname, locs)
+    return locs
+
+
+def _build_shape(obj, keyname):
+    if isinstance(obj, dict):
+        keys = tuple(obj)
+        scalar_keys = []
+        plan = []
+        for k, v in obj.items():
+            if type(v) in _SCALAR_TYPES:
+                scalar_keys.append(k)
+                child = None
+            else:
+                child = _build_shape(v, keyname)
+            if k == keyname or child is not None:
+                plan.append((k, k == keyname, child))
+        return _DictShape(keys, tuple(scalar_keys), tuple(plan))
+    if isinstance(obj, list):
+        if _SCALAR_TYPES.issuperset(map(type, obj)):
+            return _ListShape(None)
+        # 含容器的列表：以第一个元素推断元素骨架，其余元素必须一致
+        elem = _build_shape(obj[0], keyname)
+        for item in obj[1:]:
+            _collect(elem, item, [])
+        return _ListShape(elem)
+    raise _Mismatch()
+
+
+def _collect(shape, obj, locs):
+    if type(shape) is _DictShape:
+        if not isinstance(obj, dict) or tuple(obj) != shape.keys:
+            raise _Mismatch()
+        if shape.scalars is not None and not _SCALAR_TYPES.issuperset(map(type, shape.scalars(obj))):
+            raise _Mismatch()
+        for k, is_target, child in shape.plan:
+            if is_target:
+                locs.append((obj, k))
+            if child is not None:
+                _collect(child, obj[k], locs)
+    else:
+        if not isinstance(obj, list):
+            raise _Mismatch()
+        if shape.elem is None:
+            if not _SCALAR_TYPES.issuperset(map(type, obj)):
+                raise _Mismatch()
+        else:
+            for item in obj:
+                _collect(shape.elem, item, locs)
+
+
+_SHAPES = OrderedDict()
+
+
+def find_key_locations(obj, keyname) -> list:
+    """
+    返回 obj 中所有键名为 keyname 的位置 [(所在 dict, keyname), ...]，顺序与递归遍历一致。
+    通过 parent[keyname] 取值或原地替换。
+    """
+    cache_key = (keyname, tuple(obj) if isinstance(obj, dict) else type(obj).__name__)
+    shapes = _SHAPES.get(cache_key)
+    if shapes is not None:
+        _SHAPES.move_to_end(cache_key)
+        for shape in shapes:
+            locs = []
+            try:
+                _collect(shape, obj, locs)
+                return locs
+            except _Mismatch:
+                pass
+
+    locs = _walk(obj, keyname, [])
+    if shapes is None or len(shapes) < _MAX_SHAPES_PER_KEY:
+        try:
+            shape = _build_shape(obj, keyname)
+        except (_Mismatch, IndexError):
+            return locs
+        if shapes is None:
+            shapes = _SHAPES[cache_key] = []
+            if len(_SHAPES) > _MAX_CACHE_ENTRIES:
+                _SHAPES.popitem(last=False)
+        shapes.append(shape)
+    return locs
+
+
+def find_key_values(obj, keyname) -> list:
+    """obj 中所有键名为 keyname 的值（与递归查找的结果和顺序一致）。"""
+    return [parent[k] for parent, k in find_key_locations(obj, keyname)]
+
+
+def clear_key_path_cache():
+    _SHAPES.clear()
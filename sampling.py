@@ -0,0 +1,200 @@
+"""
+KS_Json_Key_Random_3ways 使用的抽样工具。
+- ReservoirSampler：Algorithm L 蓄水池抽样，对记录流单遍抽取 k 个元素，内存 O(k)，
+  跳过的元素数按几何分布一次算出，随机数调用次数约为 O(k·log(n/k))；给定种子结果可复现。
+- 候选池缓存：按 (数据源, target_object, 键路径, flatten) 缓存提取并扁平化后的候选列表，
+  同一数据源只换 seed 重复抽取时不再解析、遍历和扁平化，只需抽取下标。
+- 加权抽样：WeightedPool 附带 Walker 别名表（Vose 构建，O(n)），与候选池一起缓存，
+  之后每次抽样 O(1)；不放回抽样通过拒绝重复实现，重复过多时改用 Efraimidis-Spirakis 加权键。
+"""
+import heapq
+import math
+import os
+import random
+
+from .json_ultis import _ParseCache, _source_key, _estimate_size
+
+
+def _open_unit(rng: random.Random) -> float:
+    """(0, 1) 开区间上的均匀随机数（避免 log(0) 与 W == 1）。"""
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+
+class ReservoirSampler:
+    """
+    Algorithm L（Li, 1994）：前 k 个元素直接放入蓄水池，之后按几何分布跳过若干元素，
+    被选中的元素随机替换蓄水池中的一个位置。元素总数不超过 k 时按原顺序全部保留。
+    """
+
+    def __init__(self, k: int, rng: random.Random):
+        self.k = max(int(k), 0)
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+        self._w = 1.0
+        self._next = 0  # 下一个被选中元素的序号（从 0 开始）
+
+    def _skip(self):
+        self._next += int(math.log(_open_unit(self.rng)) / math.log(1.0 - self._w)) + 1
+
+    def add(self, item):
+        index = self.seen
+        self.seen += 1
+        if self.k == 0:
+            return
+        if index < self.k:
+            self.items.append(item)
+            if index == self.k - 1:
+                self._w = math.exp(math.log(_open_unit(self.rng)) / self.k)
+                self._next = index
+                self._skip()
+            return
+        if index == self._next:
+            self.items[self.rng.randrange(self.k)] = item
+            self._w *= math.exp(math.log(_open_unit(self.rng)) / self.k)
+            self._skip()
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+
+# 候选池缓存预算默认 256 MB（按每个候选 8 字节的引用估算，值本身与解析缓存共享），
+# 可通过环境变量 KS_JSON_POOL_CACHE_MB 调整（0 表示关闭）
+_POOL_CACHE = _ParseCache(int(os.environ.get("KS_JSON_POOL_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def pool_source_key(json_str, json_data=None):
+    """数据源标识：字符串/路径同解析缓存的键；上游 JSON 对象按对象身份（缓存项中保留引用并校验）。"""
+    source = json_data if json_data is not None else json_str
+    if isinstance(source, str):
+        source = source.strip()
+        return _source_key(source)[0] if source else None
+    return ("obj", id(source))
+
+
+def get_pool(source, target_object, key, flatten, json_data=None, weight_key=""):
+    """返回缓存的候选列表或 WeightedPool（只读，不要修改），未命中时返回 None。"""
+    if source is None:
+        return None
+    entry = _POOL_CACHE.get((source, target_object, key, flatten, weight_key))
+    if entry is None:
+        return None
+    owner, pool = entry
+    if source[0] == "obj" and owner is not json_data:
+        return None  # id 被其他对象复用
+    return pool
+
+
+def put_pool(source, target_object, key, flatten, pool, json_data=None, weight_key=""):
+    if source is None or pool is None:
+        return
+    owner = json_data if source[0] == "obj" else None
+    nbytes = pool.nbytes if isinstance(pool, WeightedPool) else 8 * len(pool) + 64
+    if owner is not None:
+        # 缓存项持有上游对象的引用（用于校验 id），上游对象因此不会被释放，按其大小计入预算
+        nbytes += _estimate_size(owner)
+    _POOL_CACHE.put((source, target_object, key, flatten, weight_key), (owner, pool), nbytes)
+
+
+def sample_pool(pool, num, rng=random):
+    """
+    从候选列表中随机抽取 num 个（默认使用全局 random，调用方负责 random.seed；
+    也可传入独立的 random.Random 实例，random.Random(seed) 与 random.seed(seed) 的序列相同）。
+    random.sample 只依赖序列长度与下标，对 range(n) 抽下标与直接对 pool 抽样结果完全相同，
+    但不需要复制候选列表，耗时只与 num 有关。
+    """
+    n = len(pool)
+    if n == 0:
+        return []
+    if num >= n:
+        return list(pool)
+    return [pool[i] for i in rng.sample(range(n), num)]
+
+
+class AliasTable:
+    """
+    Walker 别名表：对权重为正的下标建表（权重为 0 的元素不进入表，永远不会被抽中），
+    draw 每次消耗一次 randrange 和一次 random，O(1)。
+    """
+
+    def __init__(self, weights):
+        self.index = [i for i, w in enumerate(weights) if w > 0]
+        m = len(self.index)
+        self.prob = [1.0] * m
+        self.alias = list(range(m))
+        if m == 0:
+            return
+        total = math.fsum(weights[i] for i in self.index)
+        scaled = [weights[i] * m / total for i in self.index]
+        small = [j for j, p in enumerate(scaled) if p < 1.0]
+        large = [j for j, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩余项（浮点误差造成）概率视为 1
+        for j in small + large:
+            self.prob[j] = 1.0
+
+    def __len__(self):
+        return len(self.index)
+
+    def draw(self, rng) -> int:
+        j = rng.randrange(len(self.index))
+        if rng.random() >= self.prob[j]:
+            j = self.alias[j]
+        return self.index[j]
+
+
+class WeightedPool:
+    """候选值及其权重，附带别名表。"""
+
+    def __init__(self, values, weights):
+        self.values = values
+        self.weights = weights
+        self.table = AliasTable(weights)
+        self.nbytes = 40 * len(values) + 64
+
+    def __len__(self):
+        return len(self.values)
+
+
+def weighted_sample(pool: WeightedPool, num, replacement=False, rng=random):
+    """
+    按权重抽取 num 个候选值。
+    - 放回：每次 O(1) 查别名表；
+    - 不放回：抽到重复时重抽，尝试次数超过 4·num + 16 仍未抽满时，对剩余候选用
+      Efraimidis-Spirakis 加权键 u^(1/w) 取最大的若干个补足。结果按抽中顺序排列；
+      num 不小于正权重候选数时按原顺序返回全部正权重候选（与均匀抽样 num >= n 时的行为一致）。
+    """
+    table = pool.table
+    m = len(table)
+    if m == 0 or num <= 0:
+        return []
+    values = pool.values
+    if replacement:
+        return [values[table.draw(rng)] for _ in range(num)]
+    if num >= m:
+        return [values[i] for i in table.index]
+
+    chosen = {}
+    attempts = 4 * num + 16
+    while len(chosen) < num and attempts > 0:
+        chosen[table.draw(rng)] = None
+        attempts -= 1
+    if len(chosen) < num:
+        weights = pool.weights
+        rest = ((rng.random() ** (1.0 / weights[i]), i) for i in table.index if i not in chosen)
+        for _, i in heapq.nlargest(num - len(chosen), rest):
+            chosen[i] = None
+    return [values[i] for i in chosen]
+
+
+def clear_pool_cache():
+    _POOL_CACHE.clear()